@@ -3,7 +3,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import pandas as pd
-import yfinance as yf
+from event_driven_backtest.bar_cache import download
 import pprint
 import statsmodels.tsa.stattools as ts
 import statsmodels.api as sm
@@ -54,8 +54,8 @@ def plot_residuals(df):
 if __name__ == "__main__":
     start = datetime.datetime(2012, 1, 1)
     end = datetime.datetime(2013, 1, 1)
-    stock1 = yf.download("AAPL", start=start, end=end)
-    stock2 = yf.download("GOOG", start=start, end=end)
+    stock1 = download("AAPL", start=start, end=end)
+    stock2 = download("GOOG", start=start, end=end)
 
     df = pd.DataFrame(index=stock1.index)
     df["stock1"] = stock1["Adj Close"]
@@ -2,7 +2,7 @@ from __future__ import print_function
 import datetime
 import numpy as np
 import pandas as pd
-import yfinance as yf
+from event_driven_backtest.bar_cache import download
 
 def annualised_sharpe(returns, N=252):
     """
@@ -24,7 +24,7 @@ def equity_sharpe(ticker):
     end = datetime.datetime(2013,1,1)
     # Obtain the equities daily historic data for the desired time period
     # and add to a pandas DataFrame
-    pdf = yf.download(ticker, start=start, end=end)
+    pdf = download(ticker, start=start, end=end)
 
     # Use the percentage change method to easily calculate daily returns
     pdf['daily_ret'] = pdf['Close'].pct_change()
@@ -43,8 +43,8 @@ def market_neutral_sharpe(ticker, benchmark):
     end = datetime.datetime(2013, 1, 1)
     # Get historic data for both a symbol/ticker and a benchmark ticker
     # The dates have been hardcoded, but you can modify them as you see fit!
-    tick = yf.download(ticker, start=start, end=end)
-    bench = yf.download(benchmark, start=start, end=end)
+    tick = download(ticker, start=start, end=end)
+    bench = download(benchmark, start=start, end=end)
     # Calculate the percentage returns on each of the time series
     tick['daily_ret'] = tick['Close'].pct_change()
     bench['daily_ret'] = bench['Close'].pct_change()
@@ -1,7 +1,7 @@
 from __future__ import print_function
 import datetime
 import numpy as np
-import yfinance as yf
+from event_driven_backtest.bar_cache import download
 from scipy.stats import norm
 
 def var_cov_var(P, c, mu, sigma):
@@ -18,7 +18,7 @@ if __name__ == "__main__":
     start = datetime.datetime(2010, 1, 1)
     end = datetime.datetime(2014, 1, 1)
     
-    citi = yf.download("C", start=start, end=end)
+    citi = download("C", start=start, end=end)
     citi["rets"] = citi["Adj Close"].pct_change()
     P = 1e6 # 1,000,000 USD
     c = 0.99 # 99% confidence interval
@@ -0,0 +1,297 @@
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from event_driven_backtest.backtest import Backtest
+from event_driven_backtest.multi_backtest import MultiBacktest
+from event_driven_backtest.event import FillEvent
+from event_driven_backtest.event_bus import DequeEventBus
+from event_driven_backtest.execution import SimulatedExecutionHandler
+from event_driven_backtest.performance import create_sharpe_ratio, create_drawdowns
+from event_driven_backtest.portfolio import Portfolio
+from event_driven_backtest.synthetic_data import SyntheticDataHandler, synthetic_symbols
+from macd import MovingAverageCrossStrategy
+from intraday_mr import IntradayOLSMRStrategy
+
+# Benchmark grid: every benchmark runs for each (bars, symbols) pair
+BAR_COUNTS = [1000, 5000]
+SYMBOL_COUNTS = [10, 100]
+REPEAT = 3
+START = datetime.datetime(2000, 1, 1)
+HISTORY_PATH = "benchmark_history.jsonl"
+
+
+def benchmark_symbols(n_symbols):
+    """
+    Returns n_symbols symbols starting with the ('GOOG', 'AAPL') pair
+    traded by IntradayOLSMRStrategy, which the 'coint' process makes
+    a cointegrated pair.
+    """
+    return ['GOOG', 'AAPL'] + synthetic_symbols(max(n_symbols - 2, 0))
+
+
+def make_bars(n_bars, n_symbols, lookback=None, process='coint'):
+    """
+    Returns a seeded SyntheticDataHandler.
+    """
+    bars = SyntheticDataHandler(
+        DequeEventBus(), benchmark_symbols(n_symbols), START, None,
+        process=process, freq='1min', n_bars=n_bars, seed=42
+    )
+    bars.set_lookback(lookback)
+    return bars
+
+
+def bench_update_bars(n_bars, n_symbols):
+    """
+    Drips every bar, reading the latest bar value and a 100 bar
+    window of each symbol, plus a 100 bar matrix, at each bar.
+    """
+    bars = make_bars(n_bars, n_symbols, lookback=100)
+    symbols = bars.symbol_list
+    start = time.perf_counter()
+    while True:
+        bars.update_bars()
+        if not bars.continue_backtest:
+            break
+        for s in symbols:
+            bars.get_latest_bar_value(s, "Adj Close")
+            bars.get_latest_bars_values(s, "Adj Close", N=100)
+        bars.get_latest_bars_matrix("Adj Close", N=100)
+    return time.perf_counter() - start
+
+
+def bench_portfolio(n_bars, n_symbols):
+    """
+    Marks a portfolio to market at every bar and settles one fill
+    per symbol every 50 bars.
+    """
+    bars = make_bars(n_bars, n_symbols, lookback=1)
+    portfolio = Portfolio(bars, bars.events, START)
+    fills = [FillEvent(None, s, 'ARCA', 100, 'BUY', None) for s in bars.symbol_list]
+    elapsed = 0.0
+    i = 0
+    while True:
+        bars.update_bars()
+        if not bars.continue_backtest:
+            break
+        event = bars.events.get()
+        start = time.perf_counter()
+        portfolio.update_timeindex(event)
+        if i % 50 == 0:
+            for fill in fills:
+                portfolio.update_fill(fill)
+        elapsed += time.perf_counter() - start
+        i += 1
+    return elapsed
+
+
+def bench_performance(n_bars, n_symbols):
+    """
+    Computes the Sharpe ratio and drawdowns of n_symbols equity curves.
+    """
+    rng = np.random.default_rng(42)
+    curves = [
+        pd.Series(np.cumprod(1.0 + 0.01 * rng.standard_normal(n_bars)))
+        for _ in range(n_symbols)
+    ]
+    start = time.perf_counter()
+    for pnl in curves:
+        create_sharpe_ratio(pnl.pct_change(), periods=252)
+        create_drawdowns(pnl)
+    return time.perf_counter() - start
+
+
+def _bench_strategy(strategy_cls, n_bars, n_symbols):
+    """
+    Times calculate_signals of a strategy over every bar, discarding
+    the signals it generates.
+    """
+    bars = make_bars(n_bars, n_symbols)
+    events = bars.events
+    strategy = strategy_cls(bars, events)
+    bars.set_lookback(strategy.get_lookback())
+    elapsed = 0.0
+    while True:
+        bars.update_bars()
+        if not bars.continue_backtest:
+            break
+        event = events.get()
+        start = time.perf_counter()
+        strategy.calculate_signals(event)
+        elapsed += time.perf_counter() - start
+        while len(events):
+            events.get()
+    return elapsed
+
+
+def bench_ma_cross_signals(n_bars, n_symbols):
+    """
+    Times MovingAverageCrossStrategy.calculate_signals.
+    """
+    return _bench_strategy(MovingAverageCrossStrategy, n_bars, n_symbols)
+
+
+def bench_ols_mr_signals(n_bars, n_symbols):
+    """
+    Times IntradayOLSMRStrategy.calculate_signals.
+    """
+    return _bench_strategy(IntradayOLSMRStrategy, n_bars, n_symbols)
+
+
+def bench_backtest(n_bars, n_symbols):
+    """
+    Runs a full MovingAverageCrossStrategy Backtest.
+    """
+    start = time.perf_counter()
+    backtest = Backtest(
+        benchmark_symbols(n_symbols), 100000.0, 0.0, START, None,
+        SyntheticDataHandler, SimulatedExecutionHandler, Portfolio,
+        MovingAverageCrossStrategy,
+        data_handler_params=dict(process='gbm', freq='1min', n_bars=n_bars, seed=42),
+        latency_report_path=None
+    )
+    backtest._run_backtest()
+    backtest.portfolio.create_equity_curve_dataframe()
+    return time.perf_counter() - start
+
+
+def bench_multi_backtest(n_bars, n_symbols):
+    """
+    Runs an IntradayOLSMRStrategy MultiBacktest over three parameter
+    sets through simulate_trading, without writing its output files.
+    """
+    params = [
+        dict(ols_window=w, zscore_high=2.0, zscore_low=0.5) for w in (50, 100, 200)
+    ]
+    start = time.perf_counter()
+    backtest = MultiBacktest(
+        benchmark_symbols(n_symbols), 100000.0, 0.0, START, None,
+        SyntheticDataHandler, SimulatedExecutionHandler, Portfolio,
+        IntradayOLSMRStrategy, params,
+        data_handler_params=dict(process='coint', freq='1min', n_bars=n_bars, seed=42),
+        latency_report_path=None, output_path=None, equity_path=None
+    )
+    backtest.simulate_trading()
+    return time.perf_counter() - start
+
+
+BENCHMARKS = [
+    ("update_bars", bench_update_bars),
+    ("portfolio", bench_portfolio),
+    ("performance", bench_performance),
+    ("ma_cross_signals", bench_ma_cross_signals),
+    ("ols_mr_signals", bench_ols_mr_signals),
+    ("backtest", bench_backtest),
+    ("multi_backtest", bench_multi_backtest),
+]
+
+
+def run_benchmarks(bar_counts=BAR_COUNTS, symbol_counts=SYMBOL_COUNTS, repeat=REPEAT,
+                   names=None):
+    """
+    Runs every benchmark (or those named) over the grid of bar and
+    symbol counts, keeping the best of `repeat` timings, and returns
+    a list of result dictionaries. Output printed by the components
+    is discarded.
+    """
+    results = []
+    for name, func in BENCHMARKS:
+        if names is not None and name not in names:
+            continue
+        for n_bars in bar_counts:
+            for n_symbols in symbol_counts:
+                timings = []
+                for _ in range(repeat):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        timings.append(func(n_bars, n_symbols))
+                results.append({
+                    "name": name,
+                    "n_bars": n_bars,
+                    "n_symbols": n_symbols,
+                    "best_s": min(timings),
+                    "mean_s": sum(timings) / len(timings),
+                    "per_bar_us": 1e6 * min(timings) / n_bars,
+                })
+                print("%-18s bars=%-7d symbols=%-5d best %.4fs (%.1f us/bar)" % (
+                    name, n_bars, n_symbols, min(timings), 1e6 * min(timings) / n_bars
+                ))
+    return results
+
+
+def _git_commit():
+    """
+    Returns the current git commit hash, or None outside a checkout.
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_history(results, path=HISTORY_PATH):
+    """
+    Appends one JSON line holding the results and the environment
+    they were measured in to the history file, and returns it.
+    """
+    entry = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.platform(),
+        "results": results,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def load_history(path=HISTORY_PATH):
+    """
+    Returns the list of entries in a history file.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare_entries(old, new):
+    """
+    Returns (name, n_bars, n_symbols, old best, new best, ratio)
+    for every benchmark present in both history entries, where a
+    ratio above 1 is a slowdown.
+    """
+    old_results = dict(
+        ((r["name"], r["n_bars"], r["n_symbols"]), r["best_s"]) for r in old["results"]
+    )
+    rows = []
+    for r in new["results"]:
+        key = (r["name"], r["n_bars"], r["n_symbols"])
+        if key in old_results:
+            rows.append(key + (old_results[key], r["best_s"], r["best_s"] / old_results[key]))
+    return rows
+
+
+if __name__ == "__main__":
+    history_path = sys.argv[1] if len(sys.argv) > 1 else HISTORY_PATH
+    previous = load_history(history_path)
+    entry = append_history(run_benchmarks(), history_path)
+    if previous:
+        print("Compared with %s (%s):" % (previous[-1]["commit"], previous[-1]["timestamp"]))
+        for name, n_bars, n_symbols, old_s, new_s, ratio in compare_entries(previous[-1], entry):
+            print("%-18s bars=%-7d symbols=%-5d %.4fs -> %.4fs (x%.2f)" % (
+                name, n_bars, n_symbols, old_s, new_s, ratio
+            ))
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+
+# Performance analytics over one equity curve, shape (bars,), or many
+# curves at once, shape (bars, curves), with time along the first axis.
+# pandas Series and DataFrames are accepted wherever arrays are, and
+# NaNs are skipped as pandas would.
+
+
+def _values(x):
+    """
+    Returns the float array behind an array, Series or DataFrame.
+    """
+    return np.asarray(x, dtype=float)
+
+
+def returns_from_totals(totals):
+    """
+    Returns the percentage change between consecutive portfolio
+    totals, NaN on the first bar, as Series.pct_change() does.
+    """
+    totals = _values(totals)
+    returns = np.full(totals.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = totals[1:] / totals[:-1] - 1.0
+    return returns
+
+
+def equity_from_returns(returns):
+    """
+    Returns the compounded equity curve (1 + returns).cumprod(),
+    NaN where the return is, as Series.cumprod() does.
+    """
+    returns = _values(returns)
+    equity = np.nancumprod(1.0 + returns, axis=0)
+    equity[np.isnan(returns)] = np.nan
+    return equity
+
+
+def drawdowns(pnl):
+    """
+    Returns the drawdown and drawdown duration series of equity
+    curves, as create_drawdowns computes them: the high-water mark
+    starts at 0 and both series are NaN on the first bar, with the
+    duration counting the bars since the drawdown was last 0.
+    Parameters:
+    pnl - The equity curve(s).
+    """
+    pnl = _values(pnl)
+    if len(pnl) == 0:
+        return pnl.copy(), pnl.copy()
+    hwm = pnl.copy()
+    hwm[0] = 0.0
+    hwm = np.fmax.accumulate(hwm, axis=0)
+    drawdown = hwm - pnl
+    drawdown[0] = np.nan
+
+    # Bars since the last zero drawdown, NaN before the first one
+    steps = np.arange(len(pnl), dtype=float).reshape((-1,) + (1,) * (pnl.ndim - 1))
+    last_zero = np.where(drawdown == 0, steps, -1.0)
+    last_zero = np.maximum.accumulate(last_zero, axis=0)
+    duration = np.where(last_zero >= 0, steps - last_zero, np.nan)
+    return drawdown, duration
+
+
+def max_drawdown(pnl):
+    """
+    Returns the largest peak-to-trough drawdown and its longest
+    duration for each equity curve.
+    """
+    drawdown, duration = drawdowns(pnl)
+    if len(drawdown) == 0:
+        return np.full(drawdown.shape[1:], np.nan), np.full(duration.shape[1:], np.nan)
+    with np.errstate(invalid='ignore'):
+        return np.nanmax(drawdown, axis=0), np.nanmax(duration, axis=0)
+
+
+def sharpe_ratio(returns, periods=252):
+    """
+    Returns the annualised Sharpe ratio of each curve's returns,
+    against a benchmark of zero, as create_sharpe_ratio does.
+    Parameters:
+    returns - Period percentage returns.
+    periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+    """
+    returns = _values(returns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sqrt(periods) * np.nanmean(returns, axis=0) / np.nanstd(returns, axis=0)
+
+
+def sortino_ratio(returns, periods=252, target=0.0):
+    """
+    Returns the annualised Sortino ratio of each curve's returns,
+    which divides the mean excess return by the downside deviation
+    below the target rather than by the standard deviation.
+    """
+    returns = _values(returns)
+    excess = returns - target
+    downside = np.sqrt(np.nanmean(np.minimum(excess, 0.0) ** 2, axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sqrt(periods) * np.nanmean(excess, axis=0) / downside
+
+
+def max_fractional_drawdown(pnl):
+    """
+    Returns the largest peak-to-trough drawdown of each equity
+    curve as a fraction of its high-water mark, rather than in
+    units of equity as max_drawdown does.
+    """
+    pnl = _values(pnl)
+    if len(pnl) == 0:
+        return np.full(pnl.shape[1:], np.nan)
+    hwm = np.fmax.accumulate(pnl, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nanmax(1.0 - pnl / hwm, axis=0)
+
+
+def calmar_ratio(returns, periods=252):
+    """
+    Returns the Calmar ratio of each curve: its annualised
+    compounded return divided by its maximum drawdown, as a
+    fraction of the high-water mark.
+    """
+    returns = _values(returns)
+    equity = equity_from_returns(returns)
+    n = np.sum(~np.isnan(returns), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annual_return = np.nanprod(1.0 + returns, axis=0) ** (periods / n) - 1.0
+        return annual_return / max_fractional_drawdown(equity)
+
+
+def hit_rate(returns):
+    """
+    Returns the fraction of each curve's non-zero returns that
+    are positive.
+    """
+    returns = _values(returns)
+    with np.errstate(invalid='ignore'):
+        return np.sum(returns > 0, axis=0) / np.sum((returns != 0) & ~np.isnan(returns), axis=0)
+
+
+def turnover(positions, prices, totals, periods=252):
+    """
+    Returns the annualised turnover: the value traded per year
+    as a multiple of the average portfolio total.
+    Parameters:
+    positions - Quantities held, (bars, symbols), or (bars, symbols,
+    curves) for many curves over the same prices.
+    prices - Prices of the symbols, (bars, symbols).
+    totals - Portfolio totals, (bars,) or (bars, curves).
+    periods - Bars per year.
+    """
+    positions = _values(positions)
+    prices = _values(prices)
+    if positions.ndim == 3:
+        prices = prices[:, :, None]
+    traded = np.nansum(np.abs(np.diff(positions, axis=0)) * prices[1:], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sum(traded, axis=0) / np.nanmean(_values(totals), axis=0) * periods / len(traded)
+
+
+def performance_table(totals, periods=252, names=None):
+    """
+    Scores one or many equity curves from their portfolio totals,
+    returning a DataFrame with one row per curve of total return,
+    Sharpe, Sortino and Calmar ratios, maximum drawdown, drawdown
+    duration and hit rate.
+    Parameters:
+    totals - Portfolio totals, (bars,) or (bars, curves), or a
+    DataFrame with one column per curve.
+    periods - Bars per year.
+    names - Optional labels of the curves.
+    """
+    if names is None and isinstance(totals, pd.DataFrame):
+        names = list(totals.columns)
+    totals = _values(totals)
+    if totals.ndim == 1:
+        totals = totals[:, None]
+    returns = returns_from_totals(totals)
+    equity = equity_from_returns(returns)
+    max_dd, dd_duration = max_drawdown(equity)
+    return pd.DataFrame({
+        "total_return": equity[-1] - 1.0,
+        "sharpe": sharpe_ratio(returns, periods),
+        "sortino": sortino_ratio(returns, periods),
+        "calmar": calmar_ratio(returns, periods),
+        "max_drawdown": max_dd,
+        "drawdown_duration": dd_duration,
+        "hit_rate": hit_rate(returns),
+    }, index=names)
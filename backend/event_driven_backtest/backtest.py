@@ -1,9 +1,16 @@
 import datetime
 import pprint
-import queue
 import time
+from collections import deque
+from event_driven_backtest.event import EventType
+from event_driven_backtest.event_bus import DequeEventBus
+from event_driven_backtest.event_handlers import EventHandlers
+from event_driven_backtest.instrumentation import Component, LatencyRecorder, write_latency_report
+from event_driven_backtest.profiling import Profiler
+from event_driven_backtest.journal import EventJournal
+from event_driven_backtest.checkpoint import capture_state, save_checkpoint, restore_checkpoint
 
-class Backtest(object):
+class Backtest(EventHandlers):
     """
     Enscapsulates the settings and components for carrying out an event-driven backtest.
     """
@@ -11,7 +18,10 @@ class Backtest(object):
     def __init__(
     self, symbol_list, initial_capital,
     heartbeat, start_date, end_date, data_handler,
-    execution_handler, portfolio, strategy):
+    execution_handler, portfolio, strategy, data_handler_params=None,
+    event_bus=DequeEventBus, batch_size=1,
+    latency_report_path=None, profile=None, profile_path="profile",
+    journal_path=None, checkpoint_path=None, checkpoint_every=None, resume_from=None):
         """
         Initialises the backtest.
         Parameters:
@@ -21,8 +31,30 @@ class Backtest(object):
         start_date - The start date/time of the strategy.
         data_handler - (Class) Handles the market data feed.
         execution_handler - (Class) Handles the orders/fills for trades.
-        portfolio - (Class) Keeps track of portfolio current and prior positions.
-        strategy - (Class) Generates signals based on market data.
+        portfolio - (Class) Keeps track of portfolio current and prior positions,
+        or a list of classes, one per strategy.
+        strategy - (Class) Generates signals based on market data, or a list of
+        classes. Each strategy gets its own portfolio, execution handler and
+        event bus, and all of them are fed from a single data handler pass.
+        data_handler_params - Optional dict of extra keyword arguments for the data handler.
+        event_bus - (Class) The EventBus carrying events between components,
+        DequeEventBus for simulation or QueueEventBus for live use.
+        batch_size - Number of bars K per block. Above 1, the strategy's
+        calculate_signals_batch() is called once per block, while the
+        portfolio and execution still settle bar by bar.
+        latency_report_path - Optional JSON file the per-component latency
+        report is written to at the end of simulate_trading.
+        profile - None, or 'deterministic' (cProfile) or 'sampling' to run
+        the backtest under a Profiler.
+        profile_path - Path prefix of the profiler output files.
+        journal_path - Optional path of an EventJournal recording every
+        event of the run, which replay.replay_journal() can replay.
+        checkpoint_path - Optional path of a checkpoint, saved every
+        checkpoint_every bars (if given) and once the data runs out,
+        each time after the bar's events have been handled.
+        checkpoint_every - Number of bars between checkpoints.
+        resume_from - Optional checkpoint path to resume the run from.
+        The data source may have been extended since it was saved.
         """
         self.symbol_list = symbol_list
         self.initial_capital = initial_capital
@@ -34,13 +66,39 @@ class Backtest(object):
         self.execution_handler_cls = execution_handler
         self.portfolio_cls = portfolio
         self.strategy_cls = strategy
+        self.strategy_classes = strategy if isinstance(strategy, (list, tuple)) else [strategy]
+        self.num_strats = len(self.strategy_classes)
+        if isinstance(portfolio, (list, tuple)):
+            self.portfolio_classes = portfolio
+        else:
+            self.portfolio_classes = [portfolio] * self.num_strats
+        if len(self.portfolio_classes) != self.num_strats:
+            raise ValueError(
+                "%d portfolios given for %d strategies" % (len(self.portfolio_classes), self.num_strats)
+            )
+        if self.num_strats > 1 and (journal_path or checkpoint_path or resume_from):
+            raise ValueError("Journals and checkpoints only support a single strategy")
+        self.data_handler_params = data_handler_params or {}
+        self.batch_size = batch_size
+        self.latency_report_path = latency_report_path
+        self.profile = profile
+        self.profile_path = profile_path
+        self.journal_path = journal_path
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.resume_from = resume_from
         
-        self.events = queue.Queue()
+        self.event_bus_cls = event_bus
+        self.events = event_bus()
         
         self.signals = 0
         self.orders = 0
         self.fills = 0
-        self.num_strats = 1
+        self.route_handlers = self._build_event_handlers()
+        if self.num_strats == 1:
+            self.event_handlers = self.route_handlers
+        else:
+            self.event_handlers = self._build_fan_out_handlers()
         
         self._generate_trading_instances()
 
@@ -49,69 +107,225 @@ class Backtest(object):
         Generates the trading instance objects from their class types.
         """
         print("Creating DataHandler, Strategy, Portfolio, and ExecutionHandler")
-        self.data_handler = self.data_handler_cls(self.events, self.symbol_list, self.start_date, self.end_date)
-        self.strategy = self.strategy_cls(self.data_handler, self.events)
-        self.portfolio = self.portfolio_cls(self.data_handler, self.events, self.start_date, self.initial_capital)
-        self.execution_handler = self.execution_handler_cls(self.events)
+        self.data_handler = self.data_handler_cls(
+            self.events, self.symbol_list, self.start_date, self.end_date,
+            **self.data_handler_params
+        )
+
+        # One (strategy, portfolio, execution handler) route per strategy,
+        # on its own event bus unless there is only the one
+        self.strategies = []
+        self.portfolios = []
+        self.execution_handlers = []
+        self.route_pending_signals = []
+        self.route_events = []
+        self.route_counts = []
+        for strategy_cls, portfolio_cls in zip(self.strategy_classes, self.portfolio_classes):
+            events = self.events if self.num_strats == 1 else self.event_bus_cls()
+            self.strategies.append(strategy_cls(self.data_handler, events))
+            self.portfolios.append(
+                portfolio_cls(self.data_handler, events, self.start_date, self.initial_capital)
+            )
+            self.execution_handlers.append(self.execution_handler_cls(events))
+            self.route_pending_signals.append(deque())
+            self.route_events.append(events)
+            self.route_counts.append([0, 0, 0])
+        lookbacks = [strategy.get_lookback() for strategy in self.strategies]
+        self.data_handler.set_lookback(None if None in lookbacks else max(lookbacks))
+        self._activate_route(0)
+
+        self.latency = LatencyRecorder()
+        self.bars_processed = 0
+        self.journal = None
+        if self.journal_path is not None:
+            self.journal = EventJournal(
+                self.journal_path, self.data_handler, self.start_date, self.initial_capital,
+                resume=self.resume_from is not None
+            )
+
+    def _build_event_handlers(self):
+        """
+        Builds the dispatch table mapping each EventType to the
+        method that handles it, journaling every event if asked to.
+        """
+        handlers = EventHandlers._build_event_handlers(self)
+        if self.journal_path is not None:
+            handlers = [self._journaled(handler) for handler in handlers]
+        return handlers
+
+    def _build_fan_out_handlers(self):
+        """
+        Builds the dispatch table of the data handler's bus when
+        there are several strategies: each MarketEvent is fanned out
+        to every route, whose own events go through route_handlers.
+        """
+        handlers = [None] * len(EventType)
+        handlers[EventType.MARKET] = self._fan_out_market
+        return handlers
+
+    def _activate_route(self, route):
+        """
+        Points strategy, portfolio, execution_handler, pending_signals
+        and route_bus at the given route, for the event handlers.
+        """
+        self.strategy = self.strategies[route]
+        self.portfolio = self.portfolios[route]
+        self.execution_handler = self.execution_handlers[route]
+        self.pending_signals = self.route_pending_signals[route]
+        self.route_bus = self.route_events[route]
+
+    def _fan_out_market(self, event):
+        """
+        Hands a MarketEvent to each route in turn and handles the
+        signals, orders and fills that follow on the route's bus,
+        counting them per route in route_counts.
+        """
+        handlers = self.route_handlers
+        for route in range(self.num_strats):
+            self._activate_route(route)
+            signals, orders, fills = self.signals, self.orders, self.fills
+            bus = self.route_bus
+            bus.put(event)
+            while len(bus):
+                routed = bus.get()
+                if routed is not None:
+                    handlers[routed.kind](routed)
+            counts = self.route_counts[route]
+            counts[0] += self.signals - signals
+            counts[1] += self.orders - orders
+            counts[2] += self.fills - fills
+
+    def _journaled(self, handler):
+        """
+        Wraps an event handler so that each event is recorded to the
+        journal before it is handled.
+        """
+        def handle(event):
+            self.journal.record(event)
+            handler(event)
+        return handle
+
+    def _handle_bar(self, state_before_end=None):
+        """
+        Handles the events of the bar just dripped, then saves a
+        checkpoint if one is due.
+        Parameters:
+        state_before_end - Once the data has run out, the state
+        captured before the final MarketEvent, kept in the checkpoint.
+        """
+        events = self.events
+        handlers = self.event_handlers
+        while len(events):
+            event = events.get()
+            if event is not None:
+                handlers[event.kind](event)
+
+        if self.checkpoint_path is not None:
+            if not self.data_handler.continue_backtest:
+                save_checkpoint(self, self.checkpoint_path, state_before_end)
+            elif self.checkpoint_every and self.bars_processed % self.checkpoint_every == 0:
+                save_checkpoint(self, self.checkpoint_path)
 
     def _run_backtest(self):
         """
-        Executes the backtest.
-        """
-        i=0
-        while True:
-            i += 1
-            # print(i)
-            # Update the market bars
-            if self.data_handler.continue_backtest == True:
-                self.data_handler.update_bars()
-            else:
-                break
-            
-            # Handle the events
+        Executes the backtest. The data handler and journal are
+        closed however the run ends.
+        """
+        try:
+            if self.resume_from is not None:
+                restore_checkpoint(self, self.resume_from)
+                # The first bar added since a finished run is already dripped
+                if len(self.events):
+                    self._handle_bar()
+
+            i=0
             while True:
-                try:
-                    event = self.events.get(False)
-                except queue.Empty:
-                    break
+                i += 1
+                # print(i)
+                # Update the market bars
+                if self.data_handler.continue_backtest == True:
+                    start = self.latency.clock()
+                    self.data_handler.update_bars()
+                    self.latency.record(
+                        Component.DATA_HANDLER, EventType.MARKET, self.latency.clock() - start
+                    )
                 else:
-                    if event is not None:
-                        if event.type == 'MARKET':
-                            self.strategy.calculate_signals(event)
-                            self.portfolio.update_timeindex(event)
-                        elif event.type=='SIGNAL':
-                            self.signals += 1
-                            self.portfolio.update_signal(event)
-                        elif event.type == 'ORDER':
-                            self.orders+=1
-                            self.execution_handler.execute_order(event)
-                        elif event.type == 'FILL':
-                            self.fills+=1
-                            self.portfolio.update_fill(event)
-                            
-            time.sleep(self.heartbeat)
+                    break
+
+                state_before_end = None
+                if self.data_handler.continue_backtest:
+                    self.bars_processed += 1
+                elif self.checkpoint_path is not None:
+                    # Keep the state before the final MarketEvent, so that a
+                    # run resumed on extended data carries on from the last bar
+                    state_before_end = capture_state(self)
+                
+                # Handle the events
+                self._handle_bar(state_before_end)
+                                
+                time.sleep(self.heartbeat)
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+            self.data_handler.close()
+
+    def strategy_counts(self, route):
+        """
+        Returns the numbers of (signals, orders, fills) handled for
+        the strategy of a route.
+        """
+        if self.num_strats == 1:
+            return self.signals, self.orders, self.fills
+        return tuple(self.route_counts[route])
+
+    def equity_path(self, route):
+        """
+        Returns the CSV file the equity curve of a route's strategy
+        is written to: equity.csv, or with several strategies one
+        file per strategy, named after its route and class.
+        """
+        if self.num_strats == 1:
+            return 'equity.csv'
+        return 'equity_%d_%s.csv' % (route, self.strategies[route].__class__.__name__)
 
     def _output_performance(self):
         """
         Outputs the strategy performance from the backtest.
         """
 
-        self.portfolio.create_equity_curve_dataframe()
+        for route, (strategy, portfolio) in enumerate(zip(self.strategies, self.portfolios)):
+            if self.num_strats > 1:
+                print("Strategy: %s" % strategy.__class__.__name__)
+            portfolio.create_equity_curve_dataframe()
 
-        print("Creating summary stats...")
-        stats = self.portfolio.output_summary_stats()
-        
-        print("Creating equity curve...")
-        print(self.portfolio.equity_curve.tail(10))
-        pprint.pprint(stats)
+            print("Creating summary stats...")
+            stats = portfolio.output_summary_stats(self.equity_path(route))
+            
+            print("Creating equity curve...")
+            print(portfolio.equity_curve.tail(10))
+            pprint.pprint(stats)
 
-        print("Signals:%s" % self.signals)
-        print("Orders:%s" % self.orders)
-        print("Fills:%s" % self.fills)
+            signals, orders, fills = self.strategy_counts(route)
+            print("Signals:%s" % signals)
+            print("Orders:%s" % orders)
+            print("Fills:%s" % fills)
+
+        print("Time per component (s):")
+        pprint.pprint(self.latency.component_totals())
 
     def simulate_trading(self):
         """
         Simulates the backtest and outputs portfolio performance.
         """
-        self._run_backtest()
-        self._output_performance()
\ No newline at end of file
+        if self.profile is None:
+            self._run_backtest()
+        else:
+            profiler = Profiler(self.profile, self.profile_path)
+            with profiler:
+                self._run_backtest()
+            print("Profiler output: %s" % ", ".join(profiler.write()))
+        self._output_performance()
+
+        self.latency_report = self.latency.report()
+        if self.latency_report_path is not None:
+            write_latency_report(self.latency_report, self.latency_report_path)
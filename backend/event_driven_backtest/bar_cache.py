@@ -0,0 +1,252 @@
+import os, os.path
+import re
+import numpy as np
+import pandas as pd
+from event_driven_backtest.bar_store import flatten_bar_columns
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "STOCKML_BAR_CACHE",
+    os.path.join(os.path.expanduser("~"), ".stockml", "bar_cache")
+)
+
+
+# Messages yfinance records for a range that simply holds no bars,
+# as opposed to a failed download
+NO_DATA_MESSAGES = ("no data found", "no price data found", "possibly delisted")
+
+
+def yahoo_fetcher(symbol, start, end, interval):
+    """
+    Default fetcher, downloading bars from Yahoo Finance.
+    yfinance is only imported when a download is actually
+    needed, so a warm cache works without it.
+
+    yf.download returns an empty frame rather than raising when
+    a download fails, recording the error instead, so an IOError
+    is raised here for any error other than the range holding no
+    bars. An empty frame can then be trusted as an empty range.
+    """
+    import yfinance as yf
+    frame = yf.download(symbol, start=start, end=end, interval=interval, progress=False)
+    # Older yfinance versions do not record errors
+    error = getattr(getattr(yf, "shared", None), "_ERRORS", {}).get(symbol)
+    if error and not any(m in str(error).lower() for m in NO_DATA_MESSAGES):
+        raise IOError("Downloading %s failed: %s" % (symbol, error))
+    return frame
+
+
+def incomplete_from_ns(interval, now=None):
+    """
+    Returns the UTC nanoseconds from which bars of an interval may
+    still be incomplete: the start of the current bar for intraday
+    intervals such as '1m' or '1h', and the start of today for
+    daily and longer ones.
+    """
+    now = pd.Timestamp.now(tz="UTC") if now is None else pd.Timestamp(now)
+    if now.tzinfo is not None:
+        now = now.tz_convert("UTC").tz_localize(None)
+    match = re.match(r"^(\d+)(m|h)$", interval)
+    if match is None:
+        return now.normalize().value
+    unit = "min" if match.group(2) == "m" else "h"
+    return now.floor(match.group(1) + unit).value
+
+
+def to_utc_ns(ts):
+    """
+    Converts a date/datetime to UTC nanoseconds, treating naive
+    values as UTC. This is the unit used to record which date
+    ranges a cache file covers.
+    """
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.value
+
+
+class BarCache(object):
+    """
+    BarCache keeps downloaded bars on local disk, one file per
+    (symbol, interval) pair, so that repeated backtests do not
+    pay for network round trips on data already fetched.
+
+    Each file is a NumPy .npz archive holding the time index and
+    one array per field, plus the list of [start, end) date
+    ranges that have been fetched. A request only fetches the
+    gaps that are not yet covered, through a pluggable fetcher
+    with the signature fetcher(symbol, start, end, interval).
+    The fetcher raises if a download fails, so that an empty
+    result marks a range without bars as covered too.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, fetcher=yahoo_fetcher):
+        """
+        Initialises the cache.
+        Parameters:
+        cache_dir - Directory holding the cache files.
+        fetcher - Callable returning a DataFrame of bars for a
+        symbol over [start, end) at the given interval, and
+        raising if the download fails.
+        """
+        self.cache_dir = cache_dir
+        self.fetcher = fetcher
+
+    def _path(self, symbol, interval):
+        """
+        Returns the cache file path for a symbol and interval.
+        """
+        name = "%s_%s.npz" % (symbol.replace(os.sep, "_"), interval)
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self, symbol, interval):
+        """
+        Loads the cached bars and covered ranges, returning
+        (None, []) if nothing has been cached yet.
+        """
+        path = self._path(symbol, interval)
+        if not os.path.exists(path):
+            return None, []
+        with np.load(path, allow_pickle=False) as arc:
+            columns = [str(c) for c in arc["columns"]]
+            index = pd.to_datetime(arc["index"], unit="ns")
+            tz = str(arc["tz"])
+            if tz:
+                index = index.tz_localize("UTC").tz_convert(tz)
+            frame = pd.DataFrame(
+                dict((c, arc["col_%d" % i]) for i, c in enumerate(columns)),
+                index=index, columns=columns
+            )
+            covered = [tuple(int(v) for v in r) for r in arc["covered"]]
+        return frame, covered
+
+    def _save(self, symbol, interval, frame, covered):
+        """
+        Atomically writes the bars and covered ranges to disk.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index = frame.index
+        tz = ""
+        if index.tz is not None:
+            tz = str(index.tz)
+            index = index.tz_convert("UTC").tz_localize(None)
+        arrays = {
+            "index": index.values.astype("datetime64[ns]").astype(np.int64),
+            "tz": np.array(tz),
+            "columns": np.array([str(c) for c in frame.columns]),
+            "covered": np.array(covered, dtype=np.int64).reshape(-1, 2),
+        }
+        for i, c in enumerate(frame.columns):
+            arrays["col_%d" % i] = frame[c].to_numpy(dtype=np.float64)
+
+        path = self._path(symbol, interval)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _missing_ranges(covered, start_ns, end_ns):
+        """
+        Returns the sub-ranges of [start_ns, end_ns) that are
+        not yet covered.
+        """
+        missing = []
+        cur = start_ns
+        for c_start, c_end in sorted(covered):
+            if c_end <= cur:
+                continue
+            if c_start >= end_ns:
+                break
+            if c_start > cur:
+                missing.append((cur, c_start))
+            cur = max(cur, c_end)
+        if cur < end_ns:
+            missing.append((cur, end_ns))
+        return missing
+
+    @staticmethod
+    def _merge_ranges(covered):
+        """
+        Merges overlapping or adjacent covered ranges.
+        """
+        merged = []
+        for c_start, c_end in sorted(covered):
+            if merged and c_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], c_end))
+            else:
+                merged.append((c_start, c_end))
+        return merged
+
+    def get(self, symbol, start, end, interval='1d'):
+        """
+        Returns the bars for a symbol over [start, end), fetching
+        only the date ranges that are missing from the cache.
+        Parameters:
+        symbol - The ticker symbol, e.g. 'GOOG'.
+        start - The start date/time, inclusive.
+        end - The end date/time, exclusive.
+        interval - The bar interval, e.g. '1d' or '1m'.
+        """
+        frame, covered = self._load(symbol, interval)
+        start_ns, end_ns = to_utc_ns(start), to_utc_ns(end)
+        missing = self._missing_ranges(covered, start_ns, end_ns)
+
+        if missing:
+            fetched = [] if frame is None or len(frame) == 0 else [frame]
+            for m_start, m_end in missing:
+                new_bars = self.fetcher(
+                    symbol, pd.Timestamp(m_start).to_pydatetime(),
+                    pd.Timestamp(m_end).to_pydatetime(), interval
+                )
+                # The fetcher raises on a failed download, so an empty
+                # fetch is a range without bars (a weekend, a holiday)
+                if new_bars is not None and len(new_bars) > 0:
+                    fetched.append(flatten_bar_columns(new_bars))
+
+            if fetched:
+                frame = pd.concat(fetched)
+                frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+            elif frame is None:
+                frame = pd.DataFrame(index=pd.DatetimeIndex([]))
+
+            # Bars from the start of the current one on (today's, for
+            # daily bars) may still be incomplete, so only the part of
+            # a range before it is marked as covered
+            incomplete_ns = incomplete_from_ns(interval)
+            for m_start, m_end in missing:
+                m_end = min(m_end, incomplete_ns)
+                if m_start < m_end:
+                    covered.append((m_start, m_end))
+            self._save(symbol, interval, frame, self._merge_ranges(covered))
+
+        if frame is None:
+            return pd.DataFrame()
+
+        lo, hi = pd.Timestamp(start), pd.Timestamp(end)
+        if frame.index.tz is not None:
+            if lo.tzinfo is None:
+                lo = lo.tz_localize("UTC")
+            if hi.tzinfo is None:
+                hi = hi.tz_localize("UTC")
+        return frame[(frame.index >= lo) & (frame.index < hi)]
+
+
+_default_cache = None
+
+
+def get_bar_cache():
+    """
+    Returns the process-wide BarCache in DEFAULT_CACHE_DIR.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = BarCache()
+    return _default_cache
+
+
+def download(symbol, start, end, interval='1d'):
+    """
+    Cached drop-in for yf.download(symbol, start=..., end=...,
+    interval=...).
+    """
+    return get_bar_cache().get(symbol, start, end, interval)
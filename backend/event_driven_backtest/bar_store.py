@@ -0,0 +1,266 @@
+import numpy as np
+import pandas as pd
+
+
+def flatten_bar_columns(frame):
+    """
+    Returns the frame with single-level field columns. Newer
+    versions of yfinance return a (Price, Ticker) MultiIndex
+    even when a single symbol is requested.
+    """
+    if isinstance(frame.columns, pd.MultiIndex):
+        frame = frame.copy()
+        frame.columns = frame.columns.get_level_values(0)
+    return frame
+
+
+class AlignedBarArrays(object):
+    """
+    Shared cross-sectional access for stores that keep one
+    (symbols x bars) array per field with aligned columns.
+    Subclasses provide rows, data and _window(N), the [start, end)
+    columns of the latest N bars.
+    """
+
+    def latest_matrix(self, field, N=1, symbols=None):
+        """
+        Returns the last N values of a field for all symbols, or
+        for a subset of them, as a (symbols x N) array. For the
+        whole universe the result is a view; a subset is gathered
+        into a new array.
+        """
+        start, end = self._window(N)
+        if symbols is None:
+            return self.data[field][:, start:end]
+        return self.data[field][self.subset_rows(symbols), start:end]
+
+    def subset_rows(self, symbols):
+        """
+        Returns (and caches) the row numbers of a list of symbols.
+        """
+        key = tuple(symbols)
+        rows = self._subset_rows.get(key)
+        if rows is None:
+            rows = np.array([self.rows[s] for s in symbols], dtype=np.intp)
+            self._subset_rows[key] = rows
+        return rows
+
+
+class ColumnarBarStore(AlignedBarArrays):
+    """
+    ColumnarBarStore holds the OHLCV history of a set of symbols
+    that share one time index as contiguous NumPy arrays, one
+    (symbols x bars) array per field, together with a cursor that
+    marks how many bars have been "dripped" to the system so far.
+
+    Each symbol occupies one C-contiguous row, so the latest N
+    values of a field for a symbol are a zero-copy slice of that
+    row and can be returned in O(1).
+    """
+
+    def __init__(self, symbol_list, frames):
+        """
+        Initialises the store from a dictionary of DataFrames.
+        Parameters:
+        symbol_list - A list of symbol strings, fixing the row order.
+        frames - Dictionary of symbol -> DataFrame, all sharing the
+        same DatetimeIndex and the same columns.
+        """
+        self.symbol_list = list(symbol_list)
+        self.rows = dict((s, i) for i, s in enumerate(self.symbol_list))
+
+        first = flatten_bar_columns(frames[self.symbol_list[0]])
+        self.index = first.index
+        self.fields = list(first.columns)
+        self.data = {}
+        for field in self.fields:
+            self.data[field] = np.empty(
+                (len(self.symbol_list), len(self.index)), dtype=np.float64
+            )
+        for s in self.symbol_list:
+            frame = flatten_bar_columns(frames[s])
+            if not frame.index.equals(self.index):
+                raise ValueError("All symbols must share the same index: %s" % s)
+            for field in self.fields:
+                self.data[field][self.rows[s]] = frame[field].to_numpy(dtype=np.float64)
+        for field in self.fields:
+            self.data[field].flags.writeable = False
+        self._subset_rows = {}
+        self.cursor = 0
+
+    def __len__(self):
+        """
+        Returns the total number of bars held in the store.
+        """
+        return len(self.index)
+
+    def advance(self):
+        """
+        Moves the cursor on by one bar. Returns False once the
+        store is exhausted.
+        """
+        if self.cursor >= len(self.index):
+            return False
+        self.cursor += 1
+        return True
+
+    def latest_datetime(self):
+        """
+        Returns the timestamp of the last bar dripped.
+        """
+        if self.cursor == 0:
+            raise IndexError("No bars have been dripped yet.")
+        return self.index[self.cursor - 1]
+
+    def latest_value(self, symbol, field):
+        """
+        Returns the value of a field at the last bar dripped.
+        """
+        if self.cursor == 0:
+            raise IndexError("No bars have been dripped yet.")
+        return self.data[field][self.rows[symbol], self.cursor - 1]
+
+    def _window(self, N):
+        """
+        Returns the [start, end) columns of the latest N bars.
+        """
+        return max(self.cursor - N, 0), self.cursor
+
+    def latest_values(self, symbol, field, N=1):
+        """
+        Returns a view of the last N values of a field, or N-k
+        if less are available.
+        """
+        start, end = self._window(N)
+        return self.data[field][self.rows[symbol], start:end]
+
+    def upcoming_matrix(self, field, K=1):
+        """
+        Returns a view of the next K values of a field for all
+        symbols, or K-k if less remain, without moving the cursor.
+        """
+        return self.data[field][:, self.cursor:self.cursor + K]
+
+    def latest_bars(self, symbol, N=1):
+        """
+        Returns the last N bars as (datetime, pandas Series) tuples,
+        matching the shape produced by DataFrame.iterrows().
+        """
+        row = self.rows[symbol]
+        end = self.cursor
+        bars = []
+        for i in range(max(end - N, 0), end):
+            values = [self.data[field][row, i] for field in self.fields]
+            bars.append((self.index[i], pd.Series(values, index=self.fields, name=self.index[i])))
+        return bars
+
+
+class RingBarBuffer(AlignedBarArrays):
+    """
+    RingBarBuffer keeps only the latest `capacity` bars of a set of
+    aligned symbols, in one fixed-size (symbols x 2*capacity) array
+    per field, so memory stays constant however many bars are
+    appended.
+
+    Every bar is written twice, at position p and p + capacity.
+    The latest N <= capacity values of a field therefore always
+    sit in one contiguous run of a symbol's row and can be
+    returned as a zero-copy slice. Such a slice is overwritten as
+    later bars arrive, so it should be copied if kept across bars.
+    """
+
+    def __init__(self, symbol_list, fields, capacity):
+        """
+        Initialises an empty buffer.
+        Parameters:
+        symbol_list - A list of symbol strings, fixing the row order.
+        fields - A list of field names, e.g. 'Open' or 'Adj Close'.
+        capacity - The number of latest bars kept.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1, not %r" % capacity)
+        self.symbol_list = list(symbol_list)
+        self.rows = dict((s, i) for i, s in enumerate(self.symbol_list))
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.data = {}
+        for field in self.fields:
+            self.data[field] = np.full((len(self.symbol_list), 2 * capacity), np.nan)
+        self._subset_rows = {}
+        self.cursor = 0
+
+    def append(self, timestamp, values):
+        """
+        Appends one bar for every symbol, overwriting the oldest
+        bar once the buffer is full.
+        Parameters:
+        timestamp - The bar time as integer UTC nanoseconds.
+        values - A (symbols x fields) array of bar values.
+        """
+        pos = self.cursor % self.capacity
+        self.timestamps[pos] = self.timestamps[pos + self.capacity] = timestamp
+        for j, field in enumerate(self.fields):
+            data = self.data[field]
+            data[:, pos] = data[:, pos + self.capacity] = values[:, j]
+        self.cursor += 1
+
+    def update_last(self, values):
+        """
+        Overwrites the values of the last bar appended, e.g. while
+        a resampled bar is still being built.
+        Parameters:
+        values - A (symbols x fields) array of bar values.
+        """
+        if self.cursor == 0:
+            raise IndexError("No bars have been dripped yet.")
+        pos = (self.cursor - 1) % self.capacity
+        for j, field in enumerate(self.fields):
+            data = self.data[field]
+            data[:, pos] = data[:, pos + self.capacity] = values[:, j]
+
+    def _window(self, N):
+        """
+        Returns the [start, end) positions of the latest N bars.
+        """
+        n = min(N, self.cursor, self.capacity)
+        end = (self.cursor - 1) % self.capacity + 1 + self.capacity
+        return end - n, end
+
+    def latest_datetime(self):
+        """
+        Returns the timestamp of the last bar appended.
+        """
+        if self.cursor == 0:
+            raise IndexError("No bars have been dripped yet.")
+        return pd.Timestamp(int(self.timestamps[self._window(1)[0]]))
+
+    def latest_value(self, symbol, field):
+        """
+        Returns the value of a field at the last bar appended.
+        """
+        if self.cursor == 0:
+            raise IndexError("No bars have been dripped yet.")
+        return self.data[field][self.rows[symbol], self._window(1)[0]]
+
+    def latest_values(self, symbol, field, N=1):
+        """
+        Returns a view of the last N values of a field, or N-k
+        if less are available.
+        """
+        start, end = self._window(N)
+        return self.data[field][self.rows[symbol], start:end]
+
+    def latest_bars(self, symbol, N=1):
+        """
+        Returns the last N bars as (datetime, pandas Series) tuples,
+        matching the shape produced by DataFrame.iterrows().
+        """
+        row = self.rows[symbol]
+        start, end = self._window(N)
+        bars = []
+        for i in range(start, end):
+            ts = pd.Timestamp(int(self.timestamps[i]))
+            values = [self.data[field][row, i] for field in self.fields]
+            bars.append((ts, pd.Series(values, index=self.fields, name=ts)))
+        return bars
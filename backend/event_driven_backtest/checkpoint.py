@@ -0,0 +1,137 @@
+import os, os.path
+import pickle
+from event_driven_backtest.bar_cache import to_utc_ns
+
+CHECKPOINT_VERSION = 2
+
+
+def component_state(component):
+    """
+    Returns the state a strategy or portfolio carries from bar to
+    bar: the attributes named in its checkpoint_attrs. Everything
+    else, such as its data handler and event bus, is rebuilt by the
+    resumed Backtest rather than saved.
+    """
+    return dict((name, getattr(component, name)) for name in component.checkpoint_attrs)
+
+
+def capture_state(backtest):
+    """
+    Returns a pickled copy of the state of a Backtest between bars:
+    the strategy and portfolio state, the counters, any batched
+    signals still pending, the latencies and the length of the
+    journal, if any.
+    """
+    state = {
+        "strategy": component_state(backtest.strategy),
+        "portfolio": component_state(backtest.portfolio),
+        "counters": (backtest.signals, backtest.orders, backtest.fills),
+        "pending_signals": list(backtest.pending_signals),
+        "latency": backtest.latency,
+        "journal_offset": None,
+    }
+    if backtest.journal is not None:
+        state["journal_offset"] = backtest.journal.tell()
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _apply_state(backtest, data):
+    """
+    Loads a state returned by capture_state() into a Backtest.
+    """
+    state = pickle.loads(data)
+    vars(backtest.strategy).update(state["strategy"])
+    vars(backtest.portfolio).update(state["portfolio"])
+    backtest.signals, backtest.orders, backtest.fills = state["counters"]
+    backtest.pending_signals.extend(state["pending_signals"])
+    backtest.latency = state["latency"]
+    if backtest.journal is not None and state["journal_offset"] is not None:
+        # Drop what the earlier run journaled after the snapshot
+        backtest.journal.truncate(state["journal_offset"])
+
+
+def save_checkpoint(backtest, path, state_before_end=None):
+    """
+    Atomically saves a snapshot of a Backtest after the events of a
+    bar have been handled: the number of bars dripped, the time of
+    the last one and the state from capture_state(). The bars
+    themselves are not saved.
+    Parameters:
+    backtest - The Backtest to snapshot.
+    path - The checkpoint file path.
+    state_before_end - Once the data has run out, the state captured
+    before the final MarketEvent was handled, for resuming on data
+    that has been extended since.
+    """
+    bars = backtest.data_handler
+    snapshot = {
+        "version": CHECKPOINT_VERSION,
+        "symbol_list": list(backtest.symbol_list),
+        "bars_processed": backtest.bars_processed,
+        "latest_datetime": None,
+        "state": capture_state(backtest),
+        "state_before_end": state_before_end,
+    }
+    if backtest.bars_processed > 0:
+        snapshot["latest_datetime"] = to_utc_ns(bars.get_latest_bar_datetime(bars.symbol_list[0]))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def restore_checkpoint(backtest, path):
+    """
+    Restores a snapshot into a freshly created Backtest. The data
+    handler is fast forwarded past the bars already processed and
+    must then be on the same bar as when the snapshot was taken;
+    bars appended to the source since are processed by the resumed
+    run as usual.
+
+    A snapshot taken once the data ran out already holds the final
+    MarketEvent. If no bars have been added since, the run is left
+    finished rather than handling that bar again. Otherwise the
+    state from before the final MarketEvent is restored and the
+    MarketEvent of the first new bar is left on the bus, to be
+    handled by the caller.
+    Parameters:
+    backtest - The Backtest to resume, before it has run.
+    path - The checkpoint file path.
+    """
+    with open(path, "rb") as f:
+        snapshot = pickle.load(f)
+    if snapshot["version"] != CHECKPOINT_VERSION:
+        raise ValueError("Unsupported checkpoint version: %r" % snapshot["version"])
+    if snapshot["symbol_list"] != list(backtest.symbol_list):
+        raise ValueError(
+            "Checkpoint symbols %s differ from %s" % (snapshot["symbol_list"], backtest.symbol_list)
+        )
+
+    # Skip the processed bars, discarding their MarketEvents
+    bars = backtest.data_handler
+    n = snapshot["bars_processed"]
+    if n > 0:
+        bars.fast_forward(n)
+        while len(backtest.events):
+            backtest.events.get()
+        if not bars.continue_backtest or to_utc_ns(
+            bars.get_latest_bar_datetime(bars.symbol_list[0])
+        ) != snapshot["latest_datetime"]:
+            raise ValueError(
+                "The data source no longer matches the checkpoint at bar %d" % n
+            )
+    backtest.bars_processed = n
+
+    state = snapshot["state"]
+    if snapshot["state_before_end"] is not None:
+        # Look for a bar added since the run finished
+        bars.update_bars()
+        if bars.continue_backtest:
+            state = snapshot["state_before_end"]
+            backtest.bars_processed = n + 1
+        else:
+            while len(backtest.events):
+                backtest.events.get()
+    _apply_state(backtest, state)
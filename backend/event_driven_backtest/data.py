@@ -1,10 +1,16 @@
 from abc import ABCMeta, abstractmethod
 import datetime
+import heapq
 import os, os.path
 import numpy as np
 import pandas as pd
 from event_driven_backtest.event import MarketEvent
-import yfinance as yf
+from event_driven_backtest.bar_store import ColumnarBarStore, RingBarBuffer, flatten_bar_columns
+from event_driven_backtest.bar_cache import get_bar_cache, to_utc_ns
+from event_driven_backtest.prefetch import BackgroundPrefetcher
+
+# Ring buffer capacity used until a strategy declares its lookback
+DEFAULT_MAX_BARS = 1000
 
 class DataHandler(object):
     """
@@ -64,6 +70,205 @@ class DataHandler(object):
         """
         raise NotImplementedError("Should implement update_bars()")
 
+    def get_latest_bars_matrix(self, val_type, N=1, symbols=None):
+        """
+        Returns the last N values of val_type for every symbol (or
+        the given subset) as a (symbols x N) array. This default
+        stacks the per-symbol windows, right-aligned and NaN padded;
+        handlers with an aligned array store return a view instead.
+        """
+        if symbols is None:
+            symbols = self.symbol_list
+        windows = [self.get_latest_bars_values(s, val_type, N) for s in symbols]
+        matrix = np.full((len(symbols), max([len(w) for w in windows] + [0])), np.nan)
+        for i, w in enumerate(windows):
+            if len(w) > 0:
+                matrix[i, -len(w):] = w
+        return matrix
+
+    def get_latest_bar_vector(self, val_type):
+        """
+        Returns the val_type value of the last bar of every symbol as
+        a vector in symbol_list order, with NaN for symbols that have
+        not printed yet, taken from the last column of
+        get_latest_bars_matrix().
+        """
+        matrix = self.get_latest_bars_matrix(val_type, N=1)
+        if matrix.shape[1] == 0:
+            return np.full(len(self.symbol_list), np.nan)
+        return matrix[:, -1]
+
+    def close(self):
+        """
+        Releases anything the handler holds on to, such as a
+        background prefetch thread, once the backtest is over.
+        """
+        pass
+
+    def set_lookback(self, N):
+        """
+        Tells the handler the largest number of bars any strategy
+        will ask for at once. Handlers that keep a bounded history
+        use it to size their buffers; the default ignores it.
+        """
+        pass
+
+    def fast_forward(self, n):
+        """
+        Moves on by n bars without anyone acting on them, e.g. to
+        resume a backtest from a checkpoint. The default drips the
+        bars one at a time, so any buffers are rebuilt as usual; the
+        MarketEvents it puts on the bus are left for the caller to
+        discard.
+        """
+        for _ in range(n):
+            self.update_bars()
+            if not self.continue_backtest:
+                break
+
+    def peek_bars_matrix(self, val_type, K=1):
+        """
+        Returns the values of val_type for up to K upcoming bars that
+        have not been dripped yet, as a (symbols x k) array, so that
+        a strategy can compute a block of causal indicators at once.
+        Fewer than K bars may be returned near the end of the data or
+        of a loaded block. Returns None if the handler cannot look
+        ahead, which is the default.
+        """
+        return None
+
+
+class RingBufferDataHandler(DataHandler):
+    """
+    RingBufferDataHandler is a base for handlers that drip their
+    bars into a fixed-capacity RingBarBuffer, bar_buffer, holding
+    the fields listed in fields. It answers every query on the
+    latest bars from the buffer, so subclasses only provide the
+    bars, through update_bars().
+    """
+
+    # Printed when a symbol outside the data set is asked for
+    symbol_error = "That symbol is not available in the historical data set."
+
+    def set_lookback(self, N):
+        """
+        Sizes the ring buffer to the largest lookback declared by the
+        strategies, unless max_bars was given explicitly.
+        """
+        if self.max_bars is None and N is not None and self.bar_buffer.cursor == 0:
+            self.bar_buffer = RingBarBuffer(self.symbol_list, self.fields, max(N, 1))
+
+    def _check_symbol(self, symbol, val_type=None):
+        """
+        Raises a KeyError for symbols outside the data set.
+        """
+        if symbol not in self.bar_buffer.rows:
+            print(self.symbol_error)
+            raise KeyError(symbol)
+
+    def get_latest_bar(self, symbol):
+        """
+        Returns the last bar from the ring buffer.
+        """
+        self._check_symbol(symbol)
+        return self.bar_buffer.latest_bars(symbol, 1)[-1]
+
+    def get_latest_bars(self, symbol, N=1):
+        """
+        Returns the last N bars from the ring buffer,
+        or N-k if less available.
+        """
+        self._check_symbol(symbol)
+        return self.bar_buffer.latest_bars(symbol, N)
+
+    def get_latest_bar_datetime(self, symbol):
+        """
+        Returns a Python datetime object for the last bar.
+        """
+        self._check_symbol(symbol)
+        return self.bar_buffer.latest_datetime()
+
+    def get_latest_bar_value(self, symbol, val_type):
+        """
+        Returns one of the Open, High, Low, Close, Volume or OI
+        values from the last bar.
+        """
+        self._check_symbol(symbol, val_type)
+        return self.bar_buffer.latest_value(symbol, val_type)
+
+    def get_latest_bars_values(self, symbol, val_type, N=1):
+        """
+        Returns the last N bar values from the ring buffer,
+        or N-k if less available, as a view that later bars
+        overwrite.
+        """
+        self._check_symbol(symbol, val_type)
+        return self.bar_buffer.latest_values(symbol, val_type, N)
+
+    def get_latest_bars_matrix(self, val_type, N=1, symbols=None):
+        """
+        Returns the last N values of val_type for every symbol (or
+        the given subset) as a (symbols x N) array, read straight
+        from the ring buffer.
+        """
+        return self.bar_buffer.latest_matrix(val_type, N, symbols)
+
+
+class BlockDataHandler(RingBufferDataHandler):
+    """
+    BlockDataHandler is a base for ring buffer handlers whose bars
+    come in blocks from an iterator, symbol_data, which yields
+    (timestamps, values) pairs with values of shape
+    (bars x symbols x fields). The bars are dripped into the ring
+    buffer one at a time, and strategies may look ahead within the
+    current block. With prefetch set, symbol_data is a
+    BackgroundPrefetcher, which close() stops.
+    """
+
+    def close(self):
+        """
+        Stops the background prefetch thread, if any.
+        """
+        if self.prefetch:
+            self.symbol_data.close()
+
+    def _current_block(self):
+        """
+        Returns the block holding the next bar to drip, taking a new
+        block from symbol_data when the current one is used up, or
+        None once it is exhausted.
+        """
+        if self.block is None or self.block_pos >= len(self.block[0]):
+            self.block = next(self.symbol_data, None)
+            self.block_pos = 0
+        return self.block
+
+    def peek_bars_matrix(self, val_type, K=1):
+        """
+        Returns the values of val_type for up to K upcoming bars as a
+        (symbols x k) view of the current block. The look-ahead stops
+        at the end of the block.
+        """
+        block = self._current_block()
+        if block is None:
+            return np.empty((len(self.symbol_list), 0))
+        j = self.fields.index(val_type)
+        return block[1][self.block_pos:self.block_pos + K, :, j].T
+
+    def update_bars(self):
+        """
+        Drips the next bar of every symbol into the ring buffer,
+        taking a new block from symbol_data when the current one
+        is used up.
+        """
+        if self._current_block() is None:
+            self.continue_backtest = False
+        else:
+            timestamps, values = self.block
+            self.bar_buffer.append(timestamps[self.block_pos], values[self.block_pos])
+            self.block_pos += 1
+        self.events.put(MarketEvent())
+
 
 class HistoricCSVDataHandler(DataHandler):
     """
@@ -71,21 +276,39 @@ class HistoricCSVDataHandler(DataHandler):
     each requested symbol and provide an interface
     to obtain the "latest" bar in a manner identical to a live
     trading interface.
+
+    The bars are held in ColumnarBarStores, so window queries
+    return zero-copy slices of contiguous NumPy arrays.
+
+    Two merge modes are available:
+    'union' - Every symbol is reindexed onto the union of all
+    timestamps with forward fill, and all symbols move on together.
+    'event' - Each symbol keeps only its own bars, and a heap merge
+    of the per-symbol timestamps moves on only the symbols that
+    printed at each timestamp. Forward fill is resolved on read,
+    since the latest values of a symbol are those of its last print.
     """
-    def __init__(self, events, symbol_list, start, end):
+    def __init__(self, events, symbol_list, start, end, bar_cache=None, merge='union'):
         """
         Initialises the historic data handler by requesting
         a list of symbols.
         Parameters:
         events - The Event Queue.
         symbol_list - A list of symbol strings.
+        bar_cache - Optional BarCache, defaults to the shared on-disk cache.
+        merge - 'union' (padded common index) or 'event' (heap merge).
         """
+        if merge not in ('union', 'event'):
+            raise ValueError("merge must be 'union' or 'event', not %r" % merge)
         self.events = events
         self.symbol_list = symbol_list
         self.symbol_data = {}
-        self.latest_symbol_data = {}
         self.start = start
         self.end = end
+        self.bar_cache = bar_cache if bar_cache is not None else get_bar_cache()
+        self.merge = merge
+        self.latest_datetime = None
+        self.updated_symbols = []
         self.continue_backtest = True
         self._open_convert_csv_files()
 
@@ -98,106 +321,301 @@ class HistoricCSVDataHandler(DataHandler):
         """
         comb_index = None
         for s in self.symbol_list:
-            # Download data from Yahoo Finance
-            symbol_data = yf.download(s, start=self.start, end=self.end)
+            # Load data from the bar cache, downloading any missing dates from Yahoo Finance
+            symbol_data = self.bar_cache.get(s, self.start, self.end)
             
             # Store the data in the symbol_data dictionary
-            self.symbol_data[s] = symbol_data.sort_index()
+            self.symbol_data[s] = flatten_bar_columns(symbol_data).sort_index()
             
             # Combine the index to create a consistent date range for reindexing
-            if comb_index is None:
-                comb_index = self.symbol_data[s].index
-            else:
-                comb_index = comb_index.union(self.symbol_data[s].index)
+            if self.merge == 'union':
+                if comb_index is None:
+                    comb_index = self.symbol_data[s].index
+                else:
+                    comb_index = comb_index.union(self.symbol_data[s].index)
 
-            # Initialize the latest_symbol_data for each symbol
-            self.latest_symbol_data[s] = []
+        self.bar_stores = {}
+        if self.merge == 'union':
+            # Reindex each symbol's DataFrame using the combined index with forward fill
+            for s in self.symbol_list:
+                self.symbol_data[s] = self.symbol_data[s].reindex(index=comb_index, method='pad')
 
-        # Reindex each symbol's DataFrame using the combined index with forward fill
-        for s in self.symbol_list:
-            self.symbol_data[s] = self.symbol_data[s].reindex(index=comb_index, method='pad').iterrows()
-        
-    def _get_new_bar(self, symbol):
-        """
-        Returns the latest bar from the data feed.
-        """
-        for b in self.symbol_data[symbol]:
-            yield b
+            # Hold the aligned bars as contiguous columnar arrays shared by all symbols
+            self.bar_store = ColumnarBarStore(self.symbol_list, self.symbol_data)
+            for s in self.symbol_list:
+                self.bar_stores[s] = self.bar_store
+        else:
+            # Give each symbol its own store, and heap merge their timestamps
+            self.timestamps = {}
+            self.clock = []
+            for i, s in enumerate(self.symbol_list):
+                self.bar_stores[s] = ColumnarBarStore([s], {s: self.symbol_data[s]})
+                self.timestamps[s] = self.symbol_data[s].index.values.astype(
+                    "datetime64[ns]").astype(np.int64)
+                if len(self.timestamps[s]) > 0:
+                    self.clock.append((self.timestamps[s][0], i))
+            heapq.heapify(self.clock)
+        self.symbol_data = {}
 
-    def get_latest_bar(self, symbol):
+    def _get_bar_store(self, symbol):
         """
-        Returns the last bar from the latest_symbol list.
+        Returns the bar store holding a symbol.
         """
         try:
-            bars_list = self.latest_symbol_data[symbol]
+            return self.bar_stores[symbol]
         except KeyError:
             print("That symbol is not available in the historical data set.")
             raise
-        else:
-            return bars_list[-1]
+
+    def get_latest_bar(self, symbol):
+        """
+        Returns the last bar from the bar store.
+        """
+        return self._get_bar_store(symbol).latest_bars(symbol, 1)[-1]
     
     def get_latest_bars(self, symbol, N=1):
         """
-        Returns the last N bars from the latest_symbol list,
+        Returns the last N bars from the bar store,
         or N-k if less available.
         """
-        try:
-            bars_list = self.latest_symbol_data[symbol]
-        except KeyError:
-            print("That symbol is not available in the historical data set.")
-            raise
-        else:
-            return bars_list[-N:]
+        return self._get_bar_store(symbol).latest_bars(symbol, N)
 
     def get_latest_bar_datetime(self, symbol):
         """
-        Returns a Python datetime object for the last bar.
+        Returns a Python datetime object for the last bar. In
+        'event' mode this is the time of the merged clock.
         """
-        try:
-            bars_list = self.latest_symbol_data[symbol]
-        except KeyError:
-            print("That symbol is not available in the historical data set.")
-            raise
-        else:
-            return bars_list[-1][0]
+        store = self._get_bar_store(symbol)
+        if self.merge == 'event':
+            return self.latest_datetime
+        return store.latest_datetime()
 
     def get_latest_bar_value(self, symbol, val_type):
         """
         Returns one of the Open, High, Low, Close, Volume or OI
-        values from the pandas Bar series object.
+        values from the last bar, or NaN if the symbol has not
+        printed yet.
         """
-        try:
-            bars_list = self.latest_symbol_data[symbol]
-        except KeyError:
-            print("That symbol is not available in the historical data set.")
-            raise
-        else:
-            return getattr(bars_list[-1][1], val_type)
+        store = self._get_bar_store(symbol)
+        if store.cursor == 0:
+            return np.nan
+        return store.latest_value(symbol, val_type)
 
     def get_latest_bars_values(self, symbol, val_type, N=1):
         """
         Returns the last N bar values from the
-        latest_symbol list, or N-k if less available.
+        bar store, or N-k if less available. The result is
+        a read-only view, not a copy.
         """
-        try:
-            bars_list = self.get_latest_bars(symbol, N)
-        except KeyError:
-            print("That symbol is not available in the historical data set.")
-            raise
+        return self._get_bar_store(symbol).latest_values(symbol, val_type, N)
+
+    def get_latest_bars_matrix(self, val_type, N=1, symbols=None):
+        """
+        Returns the last N values of val_type for every symbol (or
+        the given subset) as a (symbols x N) array. In 'union' mode
+        this is read straight from the aligned bar store.
+        """
+        if self.merge == 'event':
+            return DataHandler.get_latest_bars_matrix(self, val_type, N, symbols)
+        return self.bar_store.latest_matrix(val_type, N, symbols)
+
+    def peek_bars_matrix(self, val_type, K=1):
+        """
+        Returns a view of the values of val_type for up to K upcoming
+        bars in 'union' mode. The heap merge of 'event' mode moves
+        symbols on unevenly, so it does not look ahead.
+        """
+        if self.merge == 'event':
+            return None
+        return self.bar_store.upcoming_matrix(val_type, K)
+
+    def fast_forward(self, n):
+        """
+        Moves on by n bars. In 'union' mode this just moves the shared
+        cursor; 'event' mode steps through the heap merge.
+        """
+        if self.merge == 'event':
+            return DataHandler.fast_forward(self, n)
+        store = self.bar_store
+        if store.cursor + n > len(store):
+            store.cursor = len(store)
+            self.continue_backtest = False
+            self.updated_symbols = []
         else:
-            return np.array([getattr(b[1], val_type) for b in bars_list])
+            store.cursor += n
+            self.updated_symbols = self.symbol_list
 
     def update_bars(self):
         """
-        Pushes the latest bar to the latest_symbol_data structure
-        for all symbols in the symbol list.
+        Moves the bar store cursors on by one timestamp. In 'union'
+        mode every symbol moves on, in 'event' mode only the symbols
+        that printed at the next timestamp do. Those symbols are
+        listed in updated_symbols.
         """
-        for s in self.symbol_list:
-            try:
-                bar = next(self._get_new_bar(s))
-            except StopIteration:
+        if self.merge == 'union':
+            if not self.bar_store.advance():
                 self.continue_backtest = False
+                self.updated_symbols = []
             else:
-                if bar is not None:
-                    self.latest_symbol_data[s].append(bar)
+                self.updated_symbols = self.symbol_list
+        elif not self.clock:
+            self.continue_backtest = False
+            self.updated_symbols = []
+        else:
+            now = self.clock[0][0]
+            self.updated_symbols = []
+            while self.clock and self.clock[0][0] == now:
+                i = self.clock[0][1]
+                s = self.symbol_list[i]
+                store = self.bar_stores[s]
+                store.advance()
+                if store.cursor < len(store):
+                    heapq.heapreplace(self.clock, (self.timestamps[s][store.cursor], i))
+                else:
+                    heapq.heappop(self.clock)
+                self.updated_symbols.append(s)
+            self.latest_datetime = store.latest_datetime()
         self.events.put(MarketEvent())
+
+
+class HistoricDirectoryDataHandler(BlockDataHandler):
+    """
+    HistoricDirectoryDataHandler reads bars from a local directory
+    holding one CSV or Parquet file per symbol, named SYMBOL.csv or
+    SYMBOL.parquet, with a datetime first column (or index) and
+    OHLCV columns. All files must share the columns of the first.
+
+    Files are streamed in fixed-size chunks through a generator
+    pipeline and the latest bars are kept in a fixed-capacity
+    RingBarBuffer, so peak memory is bounded regardless of the
+    length of the history. As with HistoricCSVDataHandler, symbols
+    are aligned on the union of their timestamps and forward filled.
+
+    Aligned bars are produced block_size at a time. With prefetch
+    enabled, the blocks are parsed and aligned on a background
+    thread while the backtest works through the current block.
+    """
+    def __init__(self, events, symbol_list, start, end, csv_dir='data',
+                 chunksize=10000, max_bars=None, block_size=256, prefetch=False):
+        """
+        Initialises the directory data handler.
+        Parameters:
+        events - The Event Queue.
+        symbol_list - A list of symbol strings.
+        start - The first date/time to include.
+        end - The date/time to stop at (exclusive).
+        csv_dir - Directory containing the per-symbol files.
+        chunksize - Number of rows read from a file at a time.
+        max_bars - Number of latest bars kept per symbol. Defaults to
+        the largest lookback declared through set_lookback().
+        block_size - Number of aligned bars produced at a time.
+        prefetch - Whether to produce blocks on a background thread.
+        """
+        self.events = events
+        self.symbol_list = symbol_list
+        self.start = start
+        self.end = end
+        self.csv_dir = csv_dir
+        self.chunksize = chunksize
+        self.max_bars = max_bars
+        self.block_size = block_size
+        self.prefetch = prefetch
+        self.fields = None
+        self.continue_backtest = True
+        self._open_convert_csv_files()
+
+    def _open_convert_csv_files(self):
+        """
+        Sets up a bar stream for each symbol, primes it with
+        the first bar, and chains the streams into a pipeline of
+        aligned blocks. Also allocates the ring buffer.
+        """
+        streams = [self._iter_bars(s) for s in self.symbol_list]
+        next_bars = [next(stream, None) for stream in streams]
+        self.symbol_data = self._iter_aligned_blocks(streams, next_bars)
+        if self.prefetch:
+            self.symbol_data = BackgroundPrefetcher(self.symbol_data)
+        self.block = None
+        self.block_pos = 0
+        self.bar_buffer = RingBarBuffer(
+            self.symbol_list, self.fields, self.max_bars or DEFAULT_MAX_BARS
+        )
+
+    def _find_file(self, symbol):
+        """
+        Returns the path of the CSV or Parquet file for a symbol.
+        """
+        for ext in ('.csv', '.csv.gz', '.parquet'):
+            path = os.path.join(self.csv_dir, symbol + ext)
+            if os.path.exists(path):
+                return path
+        print("No CSV or Parquet file found for %s in %s." % (symbol, self.csv_dir))
+        raise FileNotFoundError(symbol)
+
+    def _read_chunks(self, symbol):
+        """
+        Yields the file of a symbol as DataFrames of at most
+        chunksize rows, indexed by datetime.
+        """
+        path = self._find_file(symbol)
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=self.chunksize):
+                chunk = batch.to_pandas()
+                if not isinstance(chunk.index, pd.DatetimeIndex):
+                    chunk = chunk.set_index(chunk.columns[0])
+                yield chunk
+        else:
+            for chunk in pd.read_csv(path, index_col=0, chunksize=self.chunksize):
+                yield chunk
+
+    def _iter_bars(self, symbol):
+        """
+        Yields the (UTC nanosecond timestamp, values array) bars of
+        a symbol within [start, end), in file order. Raises a
+        ValueError if the file has no rows.
+        """
+        start_ns, end_ns = to_utc_ns(self.start), to_utc_ns(self.end)
+        rows = 0
+        for chunk in self._read_chunks(symbol):
+            rows += len(chunk)
+            index = pd.to_datetime(chunk.index)
+            if index.tz is not None:
+                index = index.tz_convert("UTC").tz_localize(None)
+            timestamps = index.values.astype("datetime64[ns]").astype(np.int64)
+            if self.fields is None:
+                self.fields = list(chunk.columns)
+            values = chunk[self.fields].to_numpy(dtype=np.float64)
+            for i in np.flatnonzero((timestamps >= start_ns) & (timestamps < end_ns)):
+                yield timestamps[i], values[i]
+        if rows == 0:
+            print("The file for %s in %s has no rows." % (symbol, self.csv_dir))
+            raise ValueError(symbol)
+
+    def _iter_aligned_blocks(self, streams, next_bars):
+        """
+        Yields (timestamps, values) blocks of up to block_size bars
+        aligned across symbols, where values has shape
+        (bars x symbols x fields). At each timestamp the symbols
+        with a bar take it and the others repeat their last bar.
+        """
+        latest_row = np.full((len(self.symbol_list), len(self.fields)), np.nan)
+        while True:
+            timestamps = np.empty(self.block_size, dtype=np.int64)
+            values = np.empty((self.block_size,) + latest_row.shape)
+            k = 0
+            while k < self.block_size:
+                pending = [b[0] for b in next_bars if b is not None]
+                if not pending:
+                    break
+                now = min(pending)
+                for i, bar in enumerate(next_bars):
+                    if bar is not None and bar[0] == now:
+                        latest_row[i] = bar[1]
+                        next_bars[i] = next(streams[i], None)
+                timestamps[k] = now
+                values[k] = latest_row
+                k += 1
+            if k == 0:
+                return
+            yield timestamps[:k], values[:k]
@@ -1,12 +1,28 @@
 from __future__ import print_function
+from enum import IntEnum
+
+class EventType(IntEnum):
+    """
+    Integer kinds of event, used to dispatch events through a
+    lookup table rather than a chain of string comparisons.
+    """
+    MARKET = 0
+    SIGNAL = 1
+    ORDER = 2
+    FILL = 3
+
 
 class Event(object):
     """
     Event is base class providing an interface for all subsequent
     (inherited) events, that will trigger further events in the
     trading infrastructure.
+
+    Events declare __slots__, so they carry no per-instance dict.
+    The string `type` and integer `kind` of each event are class
+    attributes shared by all its instances.
     """
-    pass
+    __slots__ = ()
 
 
 class MarketEvent(Event):
@@ -14,12 +30,9 @@ class MarketEvent(Event):
     Handles the event of receiving a new market update with
     corresponding bars.
     """
-
-    def __init__(self):
-        """
-        Initialises the MarketEvent.
-        """
-        self.type = 'MARKET'
+    __slots__ = ()
+    type = 'MARKET'
+    kind = EventType.MARKET
 
 
 class SignalEvent(Event):
@@ -27,6 +40,9 @@ class SignalEvent(Event):
     Handles the event of sending a Signal from a Strategy object.
     This is received by a Portfolio object and acted upon.
     """
+    __slots__ = ('strategy_id', 'symbol', 'datetime', 'signal_type', 'strength')
+    type = 'SIGNAL'
+    kind = EventType.SIGNAL
 
     def __init__(self, strategy_id, symbol, datetime, signal_type, strength):
         """
@@ -40,7 +56,6 @@ class SignalEvent(Event):
         strength - An adjustment factor "suggestion" used to scale
         quantity at the portfolio level. Useful for pairs strategies.
         """
-        self.type = 'SIGNAL'
         self.strategy_id = strategy_id
         self.symbol = symbol
         self.datetime = datetime
@@ -54,6 +69,9 @@ class OrderEvent(Event):
     The order contains a symbol (e.g. GOOG), a type (market or limit),
     quantity and a direction.
     """
+    __slots__ = ('symbol', 'order_type', 'quantity', 'direction')
+    type = 'ORDER'
+    kind = EventType.ORDER
 
     def __init__(self, symbol, order_type, quantity, direction):
         """
@@ -67,7 +85,6 @@ class OrderEvent(Event):
         quantity - Non-negative integer for quantity.
         direction - 'BUY' or 'SELL' for long or short.
         """
-        self.type = 'ORDER'
         self.symbol = symbol
         self.order_type = order_type
         self.quantity = quantity
@@ -90,6 +107,12 @@ class FillEvent(Event):
     actually filled and at what price. In addition, stores
     the commission of the trade from the brokerage.
     """
+    __slots__ = (
+        'timeindex', 'symbol', 'exchange', 'quantity',
+        'direction', 'fill_cost', 'commission'
+    )
+    type = 'FILL'
+    kind = EventType.FILL
 
     def __init__(self, timeindex, symbol, exchange, quantity,
     direction, fill_cost, commission=None):
@@ -109,7 +132,6 @@ class FillEvent(Event):
         fill_cost - The holdings value in dollars.
         commission - An optional commission sent from IB.
         """
-        self.type = 'FILL'
         self.timeindex = timeindex
         self.symbol = symbol
         self.exchange = exchange
@@ -0,0 +1,92 @@
+from abc import ABCMeta, abstractmethod
+import collections
+import queue
+
+
+class EventBus(object):
+    """
+    EventBus is an abstract base class providing the interface of
+    the events queue shared by the DataHandler, Strategy, Portfolio
+    and ExecutionHandler. Components only ever call put(); the
+    backtest loop drains the bus with get() while it is non-empty.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def put(self, event):
+        """
+        Adds an event to the back of the bus.
+        """
+        raise NotImplementedError("Should implement put()")
+
+    @abstractmethod
+    def get(self):
+        """
+        Removes and returns the event at the front of the bus,
+        without blocking. Raises IndexError if the bus is empty.
+        """
+        raise NotImplementedError("Should implement get()")
+
+    @abstractmethod
+    def __len__(self):
+        """
+        Returns the number of events waiting on the bus.
+        """
+        raise NotImplementedError("Should implement __len__()")
+
+
+class DequeEventBus(EventBus):
+    """
+    DequeEventBus is a lock-free FIFO bus for single-threaded
+    simulation, backed by a collections.deque.
+
+    put() and get() are the deque's own append() and popleft(),
+    bound on each instance, so no Python-level call is made per
+    event. popleft() raises IndexError on an empty bus, as get()
+    should.
+    """
+
+    def __init__(self):
+        """
+        Initialises an empty bus.
+        """
+        self.events = collections.deque()
+        self.put = self.events.append
+        self.get = self.events.popleft
+
+    def __len__(self):
+        return len(self.events)
+
+
+class QueueEventBus(EventBus):
+    """
+    QueueEventBus is a thread-safe bus backed by queue.Queue, for
+    live trading where market data or fills are put on the bus
+    from other threads.
+    """
+
+    def __init__(self):
+        """
+        Initialises an empty bus.
+        """
+        self.events = queue.Queue()
+
+    def put(self, event):
+        """
+        Adds an event to the back of the bus.
+        """
+        self.events.put(event)
+
+    def get(self, block=False, timeout=None):
+        """
+        Removes and returns the event at the front of the bus. By
+        default does not block, raising IndexError if it is empty.
+        """
+        try:
+            return self.events.get(block, timeout)
+        except queue.Empty:
+            raise IndexError("get from an empty event bus")
+
+    def __len__(self):
+        return self.events.qsize()
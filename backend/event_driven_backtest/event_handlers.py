@@ -0,0 +1,95 @@
+from event_driven_backtest.event import EventType
+from event_driven_backtest.instrumentation import Component
+
+
+class EventHandlers(object):
+    """
+    EventHandlers holds the timed event handlers shared by Backtest
+    and MultiBacktest, which dispatch each event to them by its
+    EventType through the table built by _build_event_handlers().
+
+    The handlers work on the current route: the strategy, portfolio,
+    execution_handler and pending_signals attributes, and route_bus,
+    the bus a route's signals are put on. They count the events in
+    signals, orders and fills, and time each component in latency,
+    a LatencyRecorder.
+    """
+
+    def _build_event_handlers(self):
+        """
+        Builds the dispatch table mapping each EventType to the
+        method that handles it.
+        """
+        handlers = [None] * len(EventType)
+        if self.batch_size > 1:
+            handlers[EventType.MARKET] = self._handle_market_batch
+        else:
+            handlers[EventType.MARKET] = self._handle_market
+        handlers[EventType.SIGNAL] = self._handle_signal
+        handlers[EventType.ORDER] = self._handle_order
+        handlers[EventType.FILL] = self._handle_fill
+        return handlers
+
+    def _handle_market(self, event):
+        """
+        Lets the strategy react to new bars, then marks the
+        portfolio to market.
+        """
+        clock = self.latency.clock
+        start = clock()
+        self.strategy.calculate_signals(event)
+        mid = clock()
+        self.portfolio.update_timeindex(event)
+        record = self.latency.record
+        record(Component.STRATEGY, EventType.MARKET, mid - start)
+        record(Component.PORTFOLIO, EventType.MARKET, clock() - mid)
+
+    def _handle_market_batch(self, event):
+        """
+        Hands the strategy's signals for the current bar of the block
+        to the bus, asking it for a new block once the last one is
+        used up, then marks the portfolio to market.
+        """
+        clock = self.latency.clock
+        start = clock()
+        if not self.pending_signals:
+            block = self.strategy.calculate_signals_batch(self.batch_size)
+            if block is None:
+                self.strategy.calculate_signals(event)
+            else:
+                self.pending_signals.extend(block)
+        if self.pending_signals:
+            for signal in self.pending_signals.popleft():
+                self.route_bus.put(signal)
+        mid = clock()
+        self.portfolio.update_timeindex(event)
+        record = self.latency.record
+        record(Component.STRATEGY, EventType.MARKET, mid - start)
+        record(Component.PORTFOLIO, EventType.MARKET, clock() - mid)
+
+    def _handle_signal(self, event):
+        """
+        Passes a signal to the portfolio to generate orders.
+        """
+        self.signals += 1
+        start = self.latency.clock()
+        self.portfolio.update_signal(event)
+        self.latency.record(Component.PORTFOLIO, EventType.SIGNAL, self.latency.clock() - start)
+
+    def _handle_order(self, event):
+        """
+        Passes an order to the execution handler.
+        """
+        self.orders += 1
+        start = self.latency.clock()
+        self.execution_handler.execute_order(event)
+        self.latency.record(Component.EXECUTION, EventType.ORDER, self.latency.clock() - start)
+
+    def _handle_fill(self, event):
+        """
+        Passes a fill to the portfolio to update holdings.
+        """
+        self.fills += 1
+        start = self.latency.clock()
+        self.portfolio.update_fill(event)
+        self.latency.record(Component.PORTFOLIO, EventType.FILL, self.latency.clock() - start)
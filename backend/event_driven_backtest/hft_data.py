@@ -1,203 +1,257 @@
-from abc import ABCMeta, abstractmethod
 import datetime
-import os, os.path
 import numpy as np
 import pandas as pd
 from event_driven_backtest.event import MarketEvent
-import yfinance as yf
-
-class DataHandler(object):
-    """
-    DataHandler is an abstract base class providing an interface for
-    all subsequent (inherited) data handlers (both live and historic).
-    The goal of a (derived) DataHandler object is to output a generated
-    set of bars (OHLCVI) for each symbol requested.
-    This will replicate how a live strategy would function as current
-    market data would be sent "down the pipe". Thus a historic and live
-    system will be treated identically by the rest of the backtesting suite.
-    """
-    __metaclass__ = ABCMeta
-
-    @abstractmethod
-    def get_latest_bar(self, symbol):
-        """
-        Returns the last bar updated.
-        """
-        raise NotImplementedError("Should implement get_latest_bar()")
-
-    @abstractmethod
-    def get_latest_bars(self, symbol, N=1):
-        """
-        Returns the last N bars updated.
-        """
-        raise NotImplementedError("Should implement get_latest_bars()")
-    
-    @abstractmethod
-    def get_latest_bar_datetime(self, symbol):
-        """
-        Returns a Python datetime object for the last bar.
-        """
-        raise NotImplementedError("Should implement get_latest_bar_datetime()")
-
-    @abstractmethod
-    def get_latest_bar_value(self, symbol, val_type):
-        """
-        Returns one of the Open, High, Low, Close, Volume or OI
-        from the last bar.
-        """
-        raise NotImplementedError("Should implement get_latest_bar_value()")
-    
-    @abstractmethod
-    def get_latest_bars_values(self, symbol, val_type, N=1):
-        """
-        Returns the last N bar values from the
-        latest_symbol list, or N-k if less available.
-        """
-        raise NotImplementedError("Should implement get_latest_bars_values()")
-
-    @abstractmethod
-    def update_bars(self):
-        """
-        Pushes the latest bars to the bars_queue for each symbol
-        in a tuple OHLCVI format: (datetime, open, high, low,
-        close, volume, open interest).
-        """
-        raise NotImplementedError("Should implement update_bars()")
-
+from event_driven_backtest.data import DataHandler, DEFAULT_MAX_BARS
+from event_driven_backtest.bar_cache import get_bar_cache, incomplete_from_ns, to_utc_ns
+from event_driven_backtest.resample import IncrementalResampler
+from event_driven_backtest.minute_bars import (
+    DEFAULT_MINUTE_DIR, END_OF_DATA, minute_bar_path, open_minute_bars,
+    read_minute_bar_range, write_minute_bars
+)
 
 class HistoricCSVDataHandlerHFT(DataHandler):
     """
-    HistoricCSVDataHandler is designed to fetch price data for
+    HistoricCSVDataHandlerHFT is designed to fetch minute bars for
     each requested symbol and provide an interface
     to obtain the "latest" bar in a manner identical to a live
     trading interface.
+
+    Bars are read from fixed-record binary files (see minute_bars)
+    opened with memory mapping, so window queries return views
+    into the mapped files rather than in-memory copies. Symbols
+    are stepped along a merged clock: at each update only the
+    symbols with a bar at the new timestamp move on, and the
+    others keep reporting their last bar.
+
+    Coarser timeframes (e.g. '5m', '15m', '1h', '1d') listed in
+    timeframes are built incrementally from the minute bars as they
+    arrive, and are read by passing timeframe= to
+    get_latest_bars_values. The last resampled bar is the one still
+    being built, so no future minute bars leak into it.
+
+    The latest value of every field is also kept per symbol, updated
+    as bars are dripped, so the cross-sectional reads of a mark to
+    market (get_latest_bar_vector) cost no work per symbol.
+
+    It is kept apart from HistoricCSVDataHandler, which holds daily
+    bars in memory in ColumnarBarStores. The stepping matches that
+    handler's 'event' merge mode, but minute histories are too
+    large to hold in memory, so they are read from mapped files.
     """
-    def __init__(self, events, symbol_list, start, end):
+    def __init__(self, events, symbol_list, start, end, bar_cache=None,
+                 data_dir=DEFAULT_MINUTE_DIR, timeframes=(), resample_bars=None):
         """
         Initialises the historic data handler by requesting
         a list of symbols.
         Parameters:
         events - The Event Queue.
         symbol_list - A list of symbol strings.
+        bar_cache - Optional BarCache, defaults to the shared on-disk cache.
+        data_dir - Directory of memory-mappable minute bar files.
+        timeframes - Coarser timeframes to build from the minute bars.
+        resample_bars - Number of resampled bars kept per symbol and
+        timeframe. Defaults to the largest lookback declared through
+        set_lookback().
         """
         self.events = events
         self.symbol_list = symbol_list
         self.symbol_data = {}
-        self.latest_symbol_data = {}
         self.start = start
         self.end = end
+        self.bar_cache = bar_cache if bar_cache is not None else get_bar_cache()
+        self.data_dir = data_dir
+        self.timeframes = list(timeframes)
+        self.resample_bars = resample_bars
         self.continue_backtest = True
         self._open_convert_csv_files()
 
     def _open_convert_csv_files(self):
         """
-        Opens the CSV files from the data directory, converting
-        them into pandas DataFrames within a symbol dictionary.
-        For this handler it will be assumed that the data is
-        taken from Yahoo. Thus its format will be respected.
+        Opens the minute bar file of each symbol with memory
+        mapping. Each file records the [start, end) range its bars
+        cover; symbols without a file, or whose file does not cover
+        the requested range, are (re)loaded from the bar cache
+        (downloading from Yahoo Finance if needed) over the union of
+        both ranges and written to data_dir. As in the bar cache,
+        the range recorded stops at the current minute, whose bar
+        may still be incomplete, and none is recorded if no bars
+        came back, so those bars are requested again next time.
         """
-        comb_index = None
-        for s in self.symbol_list:
-            # Download data from Yahoo Finance
-            symbol_data = yf.download(s, start=self.start, end=self.end, interval='1m')
-            
-            # Store the data in the symbol_data dictionary
-            self.symbol_data[s] = symbol_data.sort_index()
-            
-            # Combine the index to create a consistent date range for reindexing
-            if comb_index is None:
-                comb_index = self.symbol_data[s].index
-            else:
-                comb_index = comb_index.union(self.symbol_data[s].index)
-
-            # Initialize the latest_symbol_data for each symbol
-            self.latest_symbol_data[s] = []
-
-        # Reindex each symbol's DataFrame using the combined index with forward fill
+        start_ns, end_ns = to_utc_ns(self.start), to_utc_ns(self.end)
         for s in self.symbol_list:
-            self.symbol_data[s] = self.symbol_data[s].reindex(index=comb_index, method='pad').iterrows()
-        
-    def _get_new_bar(self, symbol):
+            path = minute_bar_path(self.data_dir, s)
+            covered = read_minute_bar_range(path)
+            if covered is None or covered[0] > start_ns or covered[1] < end_ns:
+                lo, hi = start_ns, end_ns
+                if covered is not None:
+                    lo, hi = min(lo, covered[0]), max(hi, covered[1])
+                bars = self.bar_cache.get(
+                    s, pd.Timestamp(lo).to_pydatetime(), pd.Timestamp(hi).to_pydatetime(),
+                    interval='1m'
+                )
+                write_minute_bars(
+                    path, bars, pd.Timestamp(lo), pd.Timestamp(min(hi, incomplete_from_ns('1m')))
+                )
+            self.symbol_data[s] = open_minute_bars(path, self.start, self.end)
+
+        # Number of bars dripped per symbol, and the timestamp of each symbol's next bar
+        self.symbol_rows = dict((s, i) for i, s in enumerate(self.symbol_list))
+        self.cursors = np.zeros(len(self.symbol_list), dtype=np.int64)
+        self.next_timestamps = np.array(
+            [self._timestamp_at(s, 0) for s in self.symbol_list], dtype=np.int64
+        )
+        self.latest_timestamp = None
+
+        # Latest value of each field per symbol, NaN until it trades
+        self.fields = list(self.symbol_data[self.symbol_list[0]].dtype.names[1:])
+        self.field_rows = dict((f, j) for j, f in enumerate(self.fields))
+        self.latest_values = np.full((len(self.fields), len(self.symbol_list)), np.nan)
+        self._create_resamplers(self.resample_bars or DEFAULT_MAX_BARS)
+
+    def _create_resamplers(self, capacity):
         """
-        Returns the latest bar from the data feed.
+        Creates an IncrementalResampler for each requested timeframe.
         """
-        for b in self.symbol_data[symbol]:
-            yield b
+        self.resamplers = {}
+        for tf in self.timeframes:
+            self.resamplers[tf] = IncrementalResampler(
+                self.symbol_list, self.fields, tf, capacity
+            )
 
-    def get_latest_bar(self, symbol):
+    def set_lookback(self, N):
         """
-        Returns the last bar from the latest_symbol list.
+        Sizes the resampled bar buffers to the largest lookback
+        declared by the strategies, unless resample_bars was given.
+        """
+        if self.resample_bars is None and N is not None and self.latest_timestamp is None:
+            self._create_resamplers(max(N, 1))
+
+    def _timestamp_at(self, symbol, i):
+        """
+        Returns the timestamp of the i-th bar of a symbol, or
+        END_OF_DATA past its last bar.
+        """
+        bars = self.symbol_data[symbol]
+        return bars['timestamp'][i] if i < len(bars) else END_OF_DATA
+
+    def _get_symbol_cursor(self, symbol):
+        """
+        Returns the number of bars dripped for a symbol.
         """
         try:
-            bars_list = self.latest_symbol_data[symbol]
+            return self.cursors[self.symbol_rows[symbol]]
         except KeyError:
             print("That symbol is not available in the historical data set.")
             raise
-        else:
-            return bars_list[-1]
+
+    def _record_to_bar(self, record):
+        """
+        Converts a bar record into a (datetime, pandas Series) tuple.
+        """
+        fields = record.dtype.names[1:]
+        ts = pd.Timestamp(int(record['timestamp']), tz='UTC')
+        return (ts, pd.Series([record[f] for f in fields], index=fields, name=ts))
+
+    def get_latest_bar(self, symbol):
+        """
+        Returns the last bar dripped for a symbol. Raises
+        IndexError if the symbol has not traded yet.
+        """
+        end = self._get_symbol_cursor(symbol)
+        if end == 0:
+            raise IndexError("No bars have been dripped for %s yet" % symbol)
+        return self._record_to_bar(self.symbol_data[symbol][end - 1])
     
     def get_latest_bars(self, symbol, N=1):
         """
-        Returns the last N bars from the latest_symbol list,
+        Returns the last N bars dripped for a symbol,
         or N-k if less available.
         """
-        try:
-            bars_list = self.latest_symbol_data[symbol]
-        except KeyError:
-            print("That symbol is not available in the historical data set.")
-            raise
-        else:
-            return bars_list[-N:]
+        end = self._get_symbol_cursor(symbol)
+        bars = self.symbol_data[symbol][max(end - N, 0):end]
+        return [self._record_to_bar(b) for b in bars]
 
     def get_latest_bar_datetime(self, symbol):
         """
-        Returns a Python datetime object for the last bar.
+        Returns the timestamp (UTC) of the merged clock, i.e. the
+        time of the last bar dripped across all symbols, or None
+        before the first update.
         """
-        try:
-            bars_list = self.latest_symbol_data[symbol]
-        except KeyError:
-            print("That symbol is not available in the historical data set.")
-            raise
-        else:
-            return bars_list[-1][0]
+        self._get_symbol_cursor(symbol)
+        if self.latest_timestamp is None:
+            return None
+        return pd.Timestamp(int(self.latest_timestamp), tz='UTC')
 
     def get_latest_bar_value(self, symbol, val_type):
         """
         Returns one of the Open, High, Low, Close, Volume or OI
-        values from the pandas Bar series object.
+        values from the last bar of a symbol, or NaN if the
+        symbol has not traded yet.
+        """
+        end = self._get_symbol_cursor(symbol)
+        if end == 0:
+            return np.nan
+        return self.symbol_data[symbol][val_type][end - 1]
+
+    def get_latest_bars_values(self, symbol, val_type, N=1, timeframe=None):
+        """
+        Returns the last N bar values of a symbol, or N-k if
+        less available, as a view into the mapped file. If a
+        coarser timeframe is given, the values come from its
+        resampled bars instead.
         """
+        end = self._get_symbol_cursor(symbol)
+        if timeframe is None or timeframe == '1m':
+            return self.symbol_data[symbol][val_type][max(end - N, 0):end]
         try:
-            bars_list = self.latest_symbol_data[symbol]
+            resampler = self.resamplers[timeframe]
         except KeyError:
-            print("That symbol is not available in the historical data set.")
+            print("Timeframe %s was not requested from the data handler." % timeframe)
             raise
-        else:
-            return getattr(bars_list[-1][1], val_type)
+        return resampler.get_buffer(symbol).latest_values(symbol, val_type, N)
+
+    def get_latest_bars_matrix(self, val_type, N=1, symbols=None):
+        """
+        Returns the last N values of val_type for every symbol (or
+        the given subset) as a (symbols x N) array. The last bar of
+        the whole universe comes straight from the latest values;
+        longer windows are stacked from the mapped files.
+        """
+        if N == 1 and symbols is None:
+            if self.latest_timestamp is None:
+                return np.empty((len(self.symbol_list), 0))
+            return self.get_latest_bar_vector(val_type)[:, None]
+        return DataHandler.get_latest_bars_matrix(self, val_type, N, symbols)
 
-    def get_latest_bars_values(self, symbol, val_type, N=1):
+    def get_latest_bar_vector(self, val_type):
         """
-        Returns the last N bar values from the
-        latest_symbol list, or N-k if less available.
+        Returns the val_type value of the last bar of every symbol as
+        a vector in symbol_list order, with NaN for symbols that have
+        not traded yet. The vector is a view that later bars update.
         """
         try:
-            bars_list = self.get_latest_bars(symbol, N)
+            return self.latest_values[self.field_rows[val_type]]
         except KeyError:
-            print("That symbol is not available in the historical data set.")
+            print("%s is not a field of the minute bars." % val_type)
             raise
-        else:
-            return np.array([getattr(b[1], val_type) for b in bars_list])
 
     def update_bars(self):
         """
-        Pushes the latest bar to the latest_symbol_data structure
-        for all symbols in the symbol list.
+        Advances the merged clock to the next timestamp, moving on
+        every symbol with a bar at that timestamp.
         """
-        for s in self.symbol_list:
-            try:
-                bar = next(self._get_new_bar(s))
-            except StopIteration:
-                self.continue_backtest = False
-            else:
-                if bar is not None:
-                    self.latest_symbol_data[s].append(bar)
+        now = self.next_timestamps.min()
+        if now == END_OF_DATA:
+            self.continue_backtest = False
+        else:
+            for i in np.flatnonzero(self.next_timestamps == now):
+                s = self.symbol_list[i]
+                self.cursors[i] += 1
+                self.next_timestamps[i] = self._timestamp_at(s, self.cursors[i])
+                values = self.symbol_data[s][self.cursors[i] - 1].tolist()[1:]
+                self.latest_values[:, i] = values
+                for resampler in self.resamplers.values():
+                    resampler.update(s, now, np.array(values))
+            self.latest_timestamp = now
         self.events.put(MarketEvent())
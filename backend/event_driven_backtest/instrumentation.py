@@ -0,0 +1,117 @@
+import json
+from enum import IntEnum
+from time import perf_counter_ns
+from event_driven_backtest.event import EventType
+
+# Latency histograms use power-of-two buckets: bucket b counts the
+# calls taking [2**(b-1), 2**b) nanoseconds, bucket 0 those taking 0ns
+N_BUCKETS = 64
+N_EVENT_TYPES = len(EventType)
+
+
+class Component(IntEnum):
+    """
+    Integer ids of the components whose calls are timed.
+    """
+    DATA_HANDLER = 0
+    STRATEGY = 1
+    PORTFOLIO = 2
+    EXECUTION = 3
+
+
+class LatencyRecorder(object):
+    """
+    LatencyRecorder accumulates, per (component, event type) pair,
+    the number of calls, their cumulative time and a histogram of
+    their latencies.
+
+    It is cheap enough to leave on in every run: recording is a few
+    list updates keyed by small integers, timings come from
+    perf_counter_ns, and the histogram bucket is the bit length of
+    the elapsed nanoseconds. Statistics are only assembled when a
+    report is requested.
+    """
+
+    def __init__(self):
+        """
+        Initialises empty counters for every pair.
+        """
+        n = len(Component) * N_EVENT_TYPES
+        self.counts = [0] * n
+        self.total_ns = [0] * n
+        self.histograms = [[0] * N_BUCKETS for _ in range(n)]
+        self.clock = perf_counter_ns
+
+    def record(self, component, event_type, elapsed_ns):
+        """
+        Records one call.
+        Parameters:
+        component - The Component that handled the call.
+        event_type - The EventType being handled.
+        elapsed_ns - The time taken in integer nanoseconds.
+        """
+        i = component * N_EVENT_TYPES + event_type
+        self.counts[i] += 1
+        self.total_ns[i] += elapsed_ns
+        self.histograms[i][min(elapsed_ns.bit_length(), N_BUCKETS - 1)] += 1
+
+    @staticmethod
+    def _percentile_ns(histogram, count, q):
+        """
+        Returns the upper bound of the histogram bucket holding the
+        q-quantile of the recorded latencies.
+        """
+        rank = q * count
+        seen = 0
+        for b, n in enumerate(histogram):
+            seen += n
+            if n and seen >= rank:
+                return 2 ** b
+        return 0
+
+    def report(self):
+        """
+        Returns the statistics as a nested dictionary,
+        {component: {event type: stats}}, listing only the pairs
+        that were called. Times are in microseconds; percentiles are
+        the upper bounds of their histogram buckets.
+        """
+        report = {}
+        for component in Component:
+            for event_type in EventType:
+                i = component * N_EVENT_TYPES + event_type
+                count = self.counts[i]
+                if count == 0:
+                    continue
+                histogram = self.histograms[i]
+                report.setdefault(component.name.lower(), {})[event_type.name] = {
+                    "count": count,
+                    "total_us": self.total_ns[i] / 1e3,
+                    "mean_us": self.total_ns[i] / 1e3 / count,
+                    "p50_us": self._percentile_ns(histogram, count, 0.5) / 1e3,
+                    "p90_us": self._percentile_ns(histogram, count, 0.9) / 1e3,
+                    "p99_us": self._percentile_ns(histogram, count, 0.99) / 1e3,
+                    "histogram_ns": dict(
+                        (str(2 ** b), n) for b, n in enumerate(histogram) if n
+                    ),
+                }
+        return report
+
+    def component_totals(self):
+        """
+        Returns the cumulative time in seconds spent in each
+        component, across all event types.
+        """
+        totals = {}
+        for component in Component:
+            i = component * N_EVENT_TYPES
+            totals[component.name.lower()] = sum(self.total_ns[i:i + N_EVENT_TYPES]) / 1e9
+        return totals
+
+
+def write_latency_report(report, path):
+    """
+    Writes a latency report (or a list of them) to a JSON file.
+    """
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,235 @@
+import json
+import math
+import os
+import struct
+import numpy as np
+import pandas as pd
+from event_driven_backtest.event import EventType, SignalEvent, OrderEvent, FillEvent
+from event_driven_backtest.bar_cache import to_utc_ns
+
+JOURNAL_MAGIC = b"SMLJ2\n"
+
+# Flags of a MARKET record
+NEW_BAR = 1
+TZ_AWARE = 2
+
+SIGNAL_TYPES = ['LONG', 'SHORT', 'EXIT']
+ORDER_TYPES = ['MKT', 'LMT']
+DIRECTIONS = ['BUY', 'SELL']
+
+# Fixed-size part of each record, after its 1-byte EventType
+_KIND = struct.Struct("<B")
+_MARKET = struct.Struct("<qB")           # bar time, flags; then one f8 per symbol
+_SIGNAL = struct.Struct("<qHBdq")        # strategy id, symbol, type, strength, time
+_ORDER = struct.Struct("<HBdB")          # symbol, order type, quantity, direction
+_FILL = struct.Struct("<qHdBddB")        # time, symbol, quantity, direction, cost, commission, len(exchange)
+
+
+def _to_datetime(ns):
+    """
+    Converts UTC nanoseconds back to a UTC datetime.
+    """
+    return pd.Timestamp(ns).tz_localize("UTC").to_pydatetime()
+
+
+def _to_quantity(q):
+    """
+    Converts a recorded quantity back to an int when it is whole,
+    as order sizes usually are.
+    """
+    return int(q) if q.is_integer() else q
+
+
+class EventJournal(object):
+    """
+    EventJournal records the stream of Market, Signal, Order and Fill
+    events of a backtest to a compact, append-only binary file.
+
+    The file starts with a magic string and a length-prefixed JSON
+    header (symbols, start date, initial capital). Each event is then
+    one record: a 1-byte EventType followed by fixed-size packed
+    fields. A MARKET record carries the bar time and the 'Adj Close'
+    of every symbol, i.e. everything the Portfolio reads from the
+    DataHandler, so the journal can be replayed without the data
+    handler or the strategy (see replay.py). Quantities are recorded
+    as doubles, so fractional order sizes are kept as they are.
+
+    A resumed run appends to the journal of the run it resumes,
+    which is cut back to where the checkpoint was taken (see
+    checkpoint.py) so that no event is recorded twice.
+    """
+
+    def __init__(self, path, bars, start_date, initial_capital, val_type="Adj Close",
+                 resume=False):
+        """
+        Creates the journal file and writes its header, or opens an
+        existing journal to append to.
+        Parameters:
+        path - The journal file path.
+        bars - The DataHandler of the backtest.
+        start_date - The start date of the portfolio.
+        initial_capital - The starting capital of the portfolio.
+        val_type - The bar field recorded with each MARKET event.
+        resume - Whether to append to the journal at path, if there
+        is one, rather than start a new journal.
+        """
+        self.bars = bars
+        self.symbol_list = list(bars.symbol_list)
+        self.rows = dict((s, i) for i, s in enumerate(self.symbol_list))
+        self.val_type = val_type
+        if resume and os.path.exists(path):
+            self.file = open(path, "r+b")
+            header = read_journal_header(self.file)
+            if header["symbols"] != self.symbol_list:
+                raise ValueError(
+                    "Journal symbols %s differ from %s" % (header["symbols"], self.symbol_list)
+                )
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(path, "wb")
+            header = json.dumps({
+                "symbols": self.symbol_list,
+                "val_type": val_type,
+                "start_date": pd.Timestamp(start_date).isoformat(),
+                "initial_capital": initial_capital,
+            }).encode("utf-8")
+            self.file.write(JOURNAL_MAGIC + struct.pack("<I", len(header)) + header)
+        self.writers = [None] * len(EventType)
+        self.writers[EventType.MARKET] = self._write_market
+        self.writers[EventType.SIGNAL] = self._write_signal
+        self.writers[EventType.ORDER] = self._write_order
+        self.writers[EventType.FILL] = self._write_fill
+
+    def record(self, event):
+        """
+        Appends one event to the journal. A MARKET event is recorded
+        with the bar the data handler is currently on.
+        """
+        self.writers[event.kind](event)
+
+    def _write_market(self, event):
+        """
+        Writes the bar time, flags and prices of a MARKET event.
+        """
+        bars = self.bars
+        flags = NEW_BAR if bars.continue_backtest else 0
+        latest = bars.get_latest_bar_datetime(self.symbol_list[0])
+        if getattr(latest, "tzinfo", None) is not None:
+            flags |= TZ_AWARE
+        matrix = bars.get_latest_bars_matrix(self.val_type, N=1)
+        if matrix.shape[1] > 0:
+            prices = np.ascontiguousarray(matrix[:, -1], dtype='<f8')
+        else:
+            prices = np.full(len(self.symbol_list), np.nan)
+        self.file.write(
+            _KIND.pack(EventType.MARKET) + _MARKET.pack(to_utc_ns(latest), flags)
+            + prices.tobytes()
+        )
+
+    def _write_signal(self, event):
+        """
+        Writes a SIGNAL event.
+        """
+        self.file.write(_KIND.pack(EventType.SIGNAL) + _SIGNAL.pack(
+            event.strategy_id, self.rows[event.symbol],
+            SIGNAL_TYPES.index(event.signal_type), event.strength,
+            to_utc_ns(event.datetime)
+        ))
+
+    def _write_order(self, event):
+        """
+        Writes an ORDER event.
+        """
+        self.file.write(_KIND.pack(EventType.ORDER) + _ORDER.pack(
+            self.rows[event.symbol], ORDER_TYPES.index(event.order_type),
+            event.quantity, DIRECTIONS.index(event.direction)
+        ))
+
+    def _write_fill(self, event):
+        """
+        Writes a FILL event, followed by its exchange name.
+        """
+        exchange = event.exchange.encode("utf-8")
+        fill_cost = math.nan if event.fill_cost is None else event.fill_cost
+        self.file.write(_KIND.pack(EventType.FILL) + _FILL.pack(
+            to_utc_ns(event.timeindex), self.rows[event.symbol], event.quantity,
+            DIRECTIONS.index(event.direction), fill_cost, event.commission,
+            len(exchange)
+        ) + exchange)
+
+    def tell(self):
+        """
+        Flushes the journal and returns its length in bytes.
+        """
+        self.file.flush()
+        return self.file.tell()
+
+    def truncate(self, offset):
+        """
+        Drops every record after offset, a length returned by tell().
+        """
+        self.file.seek(offset)
+        self.file.truncate()
+
+    def close(self):
+        """
+        Flushes and closes the journal file.
+        """
+        self.file.close()
+
+
+def read_journal_header(f):
+    """
+    Reads and returns the JSON header of an open journal file.
+    """
+    if f.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+        raise ValueError("Not an event journal: %s" % getattr(f, "name", f))
+    length, = struct.unpack("<I", f.read(4))
+    return json.loads(f.read(length).decode("utf-8"))
+
+
+def iter_journal(f, symbol_list):
+    """
+    Yields the records of an open journal file, positioned after its
+    header, as (EventType, payload) pairs. MARKET payloads are
+    (UTC nanoseconds, flags, prices array), the other payloads are
+    rebuilt SignalEvent, OrderEvent and FillEvent objects.
+    Parameters:
+    f - The open journal file.
+    symbol_list - The symbol list of the journal header.
+    """
+    read = f.read
+    price_bytes = 8 * len(symbol_list)
+    while True:
+        kind = read(1)
+        if not kind:
+            return
+        kind = kind[0]
+        if kind == EventType.MARKET:
+            ts, flags = _MARKET.unpack(read(_MARKET.size))
+            prices = np.frombuffer(read(price_bytes), dtype='<f8')
+            yield EventType.MARKET, (ts, flags, prices)
+        elif kind == EventType.SIGNAL:
+            strategy_id, row, signal_type, strength, ts = _SIGNAL.unpack(read(_SIGNAL.size))
+            yield EventType.SIGNAL, SignalEvent(
+                strategy_id, symbol_list[row], _to_datetime(ts),
+                SIGNAL_TYPES[signal_type], strength
+            )
+        elif kind == EventType.ORDER:
+            row, order_type, quantity, direction = _ORDER.unpack(read(_ORDER.size))
+            yield EventType.ORDER, OrderEvent(
+                symbol_list[row], ORDER_TYPES[order_type], _to_quantity(quantity),
+                DIRECTIONS[direction]
+            )
+        elif kind == EventType.FILL:
+            ts, row, quantity, direction, fill_cost, commission, n = _FILL.unpack(
+                read(_FILL.size)
+            )
+            exchange = read(n).decode("utf-8")
+            yield EventType.FILL, FillEvent(
+                _to_datetime(ts), symbol_list[row], exchange, _to_quantity(quantity),
+                DIRECTIONS[direction], None if math.isnan(fill_cost) else fill_cost,
+                commission
+            )
+        else:
+            raise ValueError("Corrupt event journal: unknown record kind %d" % kind)
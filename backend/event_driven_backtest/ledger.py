@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+# Rows allocated before a ledger first grows
+INITIAL_CAPACITY = 1024
+
+
+class Ledger(object):
+    """
+    Ledger stores the per-bar history of a Portfolio in preallocated
+    2D NumPy arrays indexed by [bar, symbol]: the positions and the
+    market value of each symbol, plus the cash, commission and total
+    of each bar. The arrays double in size when they fill up, so
+    recording a bar writes one row rather than building dicts, and
+    the positions and holdings DataFrames are built column by column
+    from the filled rows at the end of a run.
+    """
+
+    def __init__(self, symbol_list, start_date, initial_capital, capacity=INITIAL_CAPACITY):
+        """
+        Allocates the arrays and records the starting row.
+        Parameters:
+        symbol_list - The list of symbol strings, in column order.
+        start_date - The time of the starting row.
+        initial_capital - The starting cash.
+        capacity - Number of rows allocated up front.
+        """
+        self.symbol_list = list(symbol_list)
+        n = len(self.symbol_list)
+        capacity = max(capacity, 1)
+        # Positions are floats, as in Portfolio.current_positions,
+        # since fills may be fractional
+        self.positions = np.zeros((capacity, n))
+        self.market_value = np.zeros((capacity, n))
+        self.cash = np.zeros(capacity)
+        self.commission = np.zeros(capacity)
+        self.total = np.zeros(capacity)
+        self.datetimes = []
+        self.size = 0
+        self.record(start_date, 0, 0.0, initial_capital, 0.0, initial_capital)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        """
+        Doubles the number of rows of every array.
+        """
+        capacity = 2 * len(self.total)
+        for name in ("positions", "market_value", "cash", "commission", "total"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def record(self, datetime, positions, market_value, cash, commission, total):
+        """
+        Appends one bar.
+        Parameters:
+        datetime - The time of the bar.
+        positions - The quantity held of each symbol (sequence or array).
+        market_value - The market value of each symbol (sequence or array).
+        cash - The cash after the bar.
+        commission - The commission paid so far.
+        total - Cash plus the market value of all symbols.
+        """
+        i = self.size
+        if i == len(self.total):
+            self._grow()
+        self.positions[i] = positions
+        self.market_value[i] = market_value
+        self.cash[i] = cash
+        self.commission[i] = commission
+        self.total[i] = total
+        self.datetimes.append(datetime)
+        self.size = i + 1
+
+    def _index(self):
+        """
+        Returns the datetime index of the recorded rows.
+        """
+        return pd.Index(self.datetimes, name='datetime')
+
+    def positions_frame(self):
+        """
+        Returns the positions of each symbol as a DataFrame indexed
+        by datetime.
+        """
+        return pd.DataFrame(
+            self.positions[:self.size], index=self._index(), columns=self.symbol_list
+        )
+
+    def holdings_frame(self):
+        """
+        Returns the market value of each symbol, cash, commission and
+        total as a DataFrame indexed by datetime.
+        """
+        n = self.size
+        frame = pd.DataFrame(
+            self.market_value[:n], index=self._index(), columns=self.symbol_list
+        )
+        frame['cash'] = self.cash[:n]
+        frame['commission'] = self.commission[:n]
+        frame['total'] = self.total[:n]
+        return frame
@@ -0,0 +1,111 @@
+import json
+import os, os.path
+import numpy as np
+import pandas as pd
+from event_driven_backtest.bar_store import flatten_bar_columns
+from event_driven_backtest.bar_cache import to_utc_ns
+
+DEFAULT_MINUTE_DIR = os.environ.get(
+    "STOCKML_MINUTE_BARS",
+    os.path.join(os.path.expanduser("~"), ".stockml", "minute_bars")
+)
+
+# Sentinel timestamp for an exhausted symbol
+END_OF_DATA = np.iinfo(np.int64).max
+
+
+def bar_record_dtype(fields):
+    """
+    Returns the fixed-size record layout of a minute bar file:
+    an int64 UTC nanosecond timestamp followed by one float64
+    per field.
+    """
+    return np.dtype([('timestamp', '<i8')] + [(f, '<f8') for f in fields])
+
+
+def minute_bar_path(data_dir, symbol):
+    """
+    Returns the path of the minute bar file for a symbol.
+    """
+    return os.path.join(data_dir, "%s.npy" % symbol.replace(os.sep, "_"))
+
+
+def minute_bar_range_path(path):
+    """
+    Returns the path of the file recording the [start, end) range
+    a minute bar file covers.
+    """
+    return path + ".range.json"
+
+
+def read_minute_bar_range(path):
+    """
+    Returns the (start, end) UTC nanoseconds covered by a minute
+    bar file, or None if the file or its range is missing.
+    """
+    range_path = minute_bar_range_path(path)
+    if not os.path.exists(path) or not os.path.exists(range_path):
+        return None
+    with open(range_path) as f:
+        covered = json.load(f)
+    return covered["start"], covered["end"]
+
+
+def write_minute_bars(path, frame, start=None, end=None):
+    """
+    Writes a DataFrame of bars to a fixed-record binary file.
+    The file is a standard .npy array of bar_record_dtype
+    records, sorted by timestamp, so it can be memory mapped
+    by open_minute_bars.
+    Parameters:
+    path - The destination file path.
+    frame - DataFrame of bars with a DatetimeIndex.
+    start, end - The [start, end) range the bars cover, recorded
+    next to the file if given. No range is recorded for an empty
+    frame, so that its bars are requested again next time.
+    """
+    frame = flatten_bar_columns(frame).sort_index()
+    index = frame.index
+    if not isinstance(index, pd.DatetimeIndex):
+        # An empty download comes back with a RangeIndex
+        index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+
+    records = np.empty(len(frame), dtype=bar_record_dtype(list(frame.columns)))
+    records['timestamp'] = index.values.astype("datetime64[ns]").astype(np.int64)
+    for field in frame.columns:
+        records[field] = frame[field].to_numpy(dtype=np.float64)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, records)
+    os.replace(tmp_path, path)
+
+    range_path = minute_bar_range_path(path)
+    if start is not None and end is not None and len(frame) > 0 and start < end:
+        tmp_path = range_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"start": to_utc_ns(start), "end": to_utc_ns(end)}, f)
+        os.replace(tmp_path, range_path)
+    elif os.path.exists(range_path):
+        os.remove(range_path)
+
+
+def open_minute_bars(path, start=None, end=None):
+    """
+    Memory maps a minute bar file read-only, optionally
+    restricted to the bars in [start, end). The result is a view
+    into the mapping, so only the pages actually touched are
+    read, and they are shared through the OS page cache with any
+    other process mapping the same file.
+    """
+    bars = np.load(path, mmap_mode='r')
+    lo, hi = 0, len(bars)
+    if start is not None:
+        lo = np.searchsorted(bars['timestamp'], to_utc_ns(start), side='left')
+    if end is not None:
+        hi = np.searchsorted(bars['timestamp'], to_utc_ns(end), side='left')
+    return bars[lo:hi]
+
@@ -1,9 +1,17 @@
 import datetime
 import pprint
-import queue
 import time
-
-class MultiBacktest(object):
+from collections import deque
+import numpy as np
+import pandas as pd
+from event_driven_backtest.event import EventType
+from event_driven_backtest.event_bus import DequeEventBus
+from event_driven_backtest.event_handlers import EventHandlers
+from event_driven_backtest.instrumentation import Component, LatencyRecorder, write_latency_report
+from event_driven_backtest.profiling import Profiler
+from event_driven_backtest.analytics import performance_table
+
+class MultiBacktest(EventHandlers):
     """
     Enscapsulates the settings and components for carrying out an event-driven backtest.
     """
@@ -11,7 +19,10 @@ class MultiBacktest(object):
     def __init__(
     self, symbol_list, initial_capital,
     heartbeat, start_date, end_date, data_handler,
-    execution_handler, portfolio, strategy, strat_params_list
+    execution_handler, portfolio, strategy, strat_params_list,
+    data_handler_params=None, event_bus=DequeEventBus, batch_size=1,
+    latency_report_path=None, profile=None, profile_path="profile",
+    output_path="output.csv", equity_path="equity.csv"
 ):
         """
         Initialises the backtest.
@@ -24,6 +35,23 @@ class MultiBacktest(object):
         execution_handler - (Class) Handles the orders/fills for trades.
         portfolio - (Class) Keeps track of portfolio current and prior positions.
         strategy - (Class) Generates signals based on market data.
+        strat_params_list - The list of parameter sets to run, each a dict
+        of keyword arguments for the strategy.
+        data_handler_params - Optional dict of extra keyword arguments for the data handler.
+        event_bus - (Class) The EventBus carrying events between components,
+        DequeEventBus for simulation or QueueEventBus for live use.
+        batch_size - Number of bars K per block. Above 1, the strategy's
+        calculate_signals_batch() is called once per block, while the
+        portfolio and execution still settle bar by bar.
+        latency_report_path - Optional JSON file the per-component latency
+        report is written to at the end of simulate_trading.
+        profile - None, or 'deterministic' (cProfile) or 'sampling' to run
+        the backtest under a Profiler.
+        profile_path - Path prefix of the profiler output files.
+        output_path - CSV file the values and summary statistics of each
+        parameter set are written to, or None not to write it.
+        equity_path - CSV file the equity curve of each run is written
+        to, or None not to write it.
         """
         self.symbol_list = symbol_list
         self.initial_capital = initial_capital
@@ -35,34 +63,48 @@ class MultiBacktest(object):
         self.execution_handler_cls = execution_handler
         self.portfolio_cls = portfolio
         self.strategy_cls = strategy
+        self.data_handler_params = data_handler_params or {}
+        self.batch_size = batch_size
+        self.latency_report_path = latency_report_path
+        self.profile = profile
+        self.profile_path = profile_path
+        self.output_path = output_path
+        self.equity_path = equity_path
         
-        self.events = queue.Queue()
+        self.events = event_bus()
         
         self.signals = 0
         self.orders = 0
         self.fills = 0
         self.num_strats = 1
+        self.event_handlers = self._build_event_handlers()
 
         self.strat_params_list = strat_params_list
         
-        self._generate_trading_instances(self.strat_params_list)
+        self._generate_trading_instances(
+            self.strat_params_list[0] if self.strat_params_list else {}
+        )
 
     def _generate_trading_instances(self, strategy_params_dict):
         """
         Generates the trading instance objects from their class types.
+        Parameters:
+        strategy_params_dict - The keyword arguments of the strategy.
         """
         print("Creating DataHandler, Strategy, Portfolio, and ExecutionHandler for")
         print("strategy parameter list: %s..." % strategy_params_dict)
 
         # Create DataHandler instance
         self.data_handler = self.data_handler_cls(
-            self.events, self.symbol_list, self.start_date, self.end_date
+            self.events, self.symbol_list, self.start_date, self.end_date,
+            **self.data_handler_params
         )
 
         # Create Strategy instance
         self.strategy = self.strategy_cls(
-            self.data_handler, self.events
+            self.data_handler, self.events, **strategy_params_dict
         )
+        self.data_handler.set_lookback(self.strategy.get_lookback())
 
         # Create Portfolio instance
         self.portfolio = self.portfolio_cls(
@@ -73,42 +115,44 @@ class MultiBacktest(object):
         # Create ExecutionHandler instance
         self.execution_handler = self.execution_handler_cls(self.events)
 
+        # Signals of the current block, one list per remaining bar
+        self.pending_signals = deque()
+        self.route_bus = self.events
+
+        # Latencies of this parameter set's run
+        self.latency = LatencyRecorder()
+
     def _run_backtest(self):
         """
-        Executes the backtest.
+        Executes the backtest. The data handler is closed however
+        the run ends.
         """
-        i=0
-        while True:
-            i += 1
-            # print(i)
-            # Update the market bars
-            if self.data_handler.continue_backtest == True:
-                self.data_handler.update_bars()
-            else:
-                break
-            
-            # Handle the events
+        try:
+            i=0
             while True:
-                try:
-                    event = self.events.get(False)
-                except queue.Empty:
-                    break
+                i += 1
+                # print(i)
+                # Update the market bars
+                if self.data_handler.continue_backtest == True:
+                    start = self.latency.clock()
+                    self.data_handler.update_bars()
+                    self.latency.record(
+                        Component.DATA_HANDLER, EventType.MARKET, self.latency.clock() - start
+                    )
                 else:
+                    break
+                
+                # Handle the events
+                events = self.events
+                handlers = self.event_handlers
+                while len(events):
+                    event = events.get()
                     if event is not None:
-                        if event.type == 'MARKET':
-                            self.strategy.calculate_signals(event)
-                            self.portfolio.update_timeindex(event)
-                        elif event.type=='SIGNAL':
-                            self.signals += 1
-                            self.portfolio.update_signal(event)
-                        elif event.type == 'ORDER':
-                            self.orders+=1
-                            self.execution_handler.execute_order(event)
-                        elif event.type == 'FILL':
-                            self.fills+=1
-                            self.portfolio.update_fill(event)
-                            
-            time.sleep(self.heartbeat)
+                        handlers[event.kind](event)
+                                
+                time.sleep(self.heartbeat)
+        finally:
+            self.data_handler.close()
 
     def _output_performance(self):
         """
@@ -118,7 +162,7 @@ class MultiBacktest(object):
         self.portfolio.create_equity_curve_dataframe()
 
         print("Creating summary stats...")
-        stats = self.portfolio.output_summary_stats()
+        stats = self.portfolio.output_summary_stats(self.equity_path)
         
         print("Creating equity curve...")
         print(self.portfolio.equity_curve.tail(10))
@@ -127,15 +171,26 @@ class MultiBacktest(object):
         print("Signals:%s" % self.signals)
         print("Orders:%s" % self.orders)
         print("Fills:%s" % self.fills)
+        print("Time per component (s):")
+        pprint.pprint(self.latency.component_totals())
 
         return stats
 
     def simulate_trading(self):
         """
         Simulates the backtest and outputs portfolio performance.
+        The performance_table of the whole sweep, one row per
+        parameter set, is left in sweep_stats.
         """
-        out = open("output.csv", "w")
+        out = None
+        if self.output_path is not None:
+            out = open(self.output_path, "w")
         spl = len(self.strat_params_list)
+        self.latency_reports = []
+        totals = []
+        profiler = None
+        if self.profile is not None:
+            profiler = Profiler(self.profile, self.profile_path)
         
         for i, sp in enumerate(self.strat_params_list):
             print("Strategy %s out of %s..." % (i + 1, spl))
@@ -143,12 +198,21 @@ class MultiBacktest(object):
             # Generate trading instances
             self._generate_trading_instances(sp)
             
-            # Run backtest
-            self._run_backtest()
+            # Run backtest, accumulating any profile across parameter sets
+            if profiler is None:
+                self._run_backtest()
+            else:
+                with profiler:
+                    self._run_backtest()
             
             # Get performance stats
             stats = self._output_performance()
             pprint.pprint(stats)
+            self.latency_reports.append(
+                {"strategy_params": sp, "latency": self.latency.report()}
+            )
+            ledger = self.portfolio.ledger
+            totals.append(ledger.total[:len(ledger)])
             
 
             # Extract performance metrics
@@ -157,12 +221,24 @@ class MultiBacktest(object):
             max_dd = float(stats[2][1].replace("%", ""))
             dd_dur = int(stats[3][1])
             
-            # Write the results to the output file
-            out.write(
-                "%s,%s,%s,%s,%s,%s,%s\n" % (
-                    sp["ols_window"], sp["zscore_high"], sp["zscore_low"],
-                    tot_ret, sharpe, max_dd, dd_dur
-                )
-            )
+            # Write the parameter values, in order, and the results to the output file
+            if out is not None:
+                out.write(",".join(
+                    [str(v) for v in sp.values()] + [str(tot_ret), str(sharpe), str(max_dd), str(dd_dur)]
+                ) + "\n")
         
-        out.close()
+        if out is not None:
+            out.close()
+
+        # Score the whole sweep at once, if there was anything to run
+        if totals:
+            self.sweep_stats = performance_table(
+                np.column_stack(totals), self.portfolio.periods,
+                names=[str(sp) for sp in self.strat_params_list]
+            )
+        else:
+            self.sweep_stats = pd.DataFrame()
+        if profiler is not None:
+            print("Profiler output: %s" % ", ".join(profiler.write()))
+        if self.latency_report_path is not None:
+            write_latency_report(self.latency_reports, self.latency_report_path)
@@ -0,0 +1,93 @@
+import math
+import numpy as np
+
+
+class OnlineStats(object):
+    """
+    OnlineStats accumulates the summary statistics of an equity
+    curve one bar at a time, in O(1) time and memory per bar, so
+    they can be queried mid-run without building the curve.
+
+    It follows the definitions used at the end of a run (see
+    Portfolio.output_summary_stats): returns are the percentage
+    changes of the portfolio total, the Sharpe ratio uses their
+    mean and population standard deviation, kept with Welford's
+    algorithm, and drawdowns are measured on the compounded equity
+    curve from a high-water mark starting at 0.
+    """
+
+    def __init__(self, initial_capital):
+        """
+        Initialises the accumulator.
+        Parameters:
+        initial_capital - The portfolio total before the first bar.
+        """
+        self.last_total = initial_capital
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.equity = 1.0
+        self.hwm = 0.0
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.duration = 0
+        self.max_duration = 0
+
+    def update(self, total):
+        """
+        Adds one bar.
+        Parameters:
+        total - The portfolio total at the bar.
+        """
+        r = total / self.last_total - 1.0 if self.last_total != 0 else np.nan
+        self.last_total = total
+
+        if math.isnan(r):
+            # A missing return leaves the equity and high-water mark as they were
+            self.drawdown = np.nan
+            self.duration += 1
+        else:
+            self.n += 1
+            delta = r - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (r - self.mean)
+
+            self.equity *= 1.0 + r
+            self.hwm = max(self.hwm, self.equity)
+            self.drawdown = self.hwm - self.equity
+            self.duration = 0 if self.drawdown == 0 else self.duration + 1
+            self.max_drawdown = max(self.max_drawdown, self.drawdown)
+        self.max_duration = max(self.max_duration, self.duration)
+
+    def variance(self):
+        """
+        Returns the population variance of the returns so far.
+        """
+        return self.m2 / self.n if self.n else np.nan
+
+    def sharpe_ratio(self, periods=252):
+        """
+        Returns the annualised Sharpe ratio of the returns so far.
+        Parameters:
+        periods - Daily (252), Hourly (252*6.5), Minutely(252*6.5*60) etc.
+        """
+        std = math.sqrt(self.variance()) if self.n else np.nan
+        if not std > 0:
+            return np.nan
+        return np.sqrt(periods) * self.mean / std
+
+    def total_return(self):
+        """
+        Returns the compounded return so far, e.g. 0.05 for +5%.
+        """
+        return self.equity - 1.0
+
+    def summary_stats(self, periods=252):
+        """
+        Returns the summary statistics so far, formatted as by
+        Portfolio.output_summary_stats.
+        """
+        return [("Total Return", "%0.2f%%" % (self.total_return() * 100.0)),
+                ("Sharpe Ratio", "%0.2f" % self.sharpe_ratio(periods)),
+                ("Max Drawdown", "%0.2f%%" % (self.max_drawdown * 100.0)),
+                ("Drawdown Duration", "%d" % self.max_duration)]
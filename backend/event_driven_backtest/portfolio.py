@@ -5,6 +5,9 @@ import numpy as np
 import pandas as pd
 from event_driven_backtest.event import FillEvent, OrderEvent
 from event_driven_backtest.performance import create_sharpe_ratio, create_drawdowns
+from event_driven_backtest.ledger import Ledger
+from event_driven_backtest.online_stats import OnlineStats
+from event_driven_backtest.rolling_metrics import RollingMetrics
 
 class Portfolio(object):
     """
@@ -12,14 +15,39 @@ class Portfolio(object):
     value of all instruments at a resolution of a "bar,"
     i.e., secondly, minutely, 5-min, 30-min, 60-min, or EOD.
 
-    The positions DataFrame stores a time-index of the
-    quantity of positions held.
-
-    The holdings DataFrame stores the cash and total market
-    holdings value of each symbol for a particular
-    time-index, as well as the percentage change in
+    The ledger stores a time-index of the quantity of
+    positions held, and of the cash and total market
+    holdings value of each symbol, from which the equity
+    curve DataFrame adds the percentage change in
     portfolio total across bars.
+
+    Each bar is marked to market at once, multiplying the
+    vector of positions by the vector of latest prices.
+
+    The summary statistics are also kept up to date bar
+    by bar in stats, an OnlineStats, and can be queried
+    mid-run with current_summary_stats(). If rolling_window
+    is set, rolling holds a RollingMetrics over that many
+    bars, with beta measured against benchmark_symbol.
+
+    periods is the number of bars per year used to
+    annualise the Sharpe ratio. If revalue_changed_only is
+    set, only the symbols whose price or position changed
+    since the previous bar are revalued.
     """
+
+    periods = 252*6.5
+    revalue_changed_only = False
+    rolling_window = None
+    benchmark_symbol = None
+
+    # Attributes holding the state carried from bar to bar, saved
+    # by checkpoints (see checkpoint.py)
+    checkpoint_attrs = (
+        'ledger', 'current_positions', 'current_holdings', 'stats',
+        'position_vector', 'market_values', 'last_prices',
+        'positions_changed', 'rolling'
+    )
     
     def __init__(self, bars, events, start_date, initial_capital=100000.0):
         """
@@ -38,31 +66,34 @@ class Portfolio(object):
         self.symbol_list = self.bars.symbol_list
         self.start_date = start_date
         self.initial_capital = initial_capital
-        self.all_positions = self.construct_all_positions()
+        self.ledger = self.construct_ledger()
         self.current_positions = dict((k, v) for k, v in[(s, 0) for s in self.symbol_list])
-        self.all_holdings = self.construct_all_holdings()
         self.current_holdings = self.construct_current_holdings()
+        self.stats = OnlineStats(self.initial_capital)
 
-    def construct_all_positions(self):
-        """
-        Constructs the positions list using the start_date
-        to determine when the time index will begin.
-        """
-        d = dict((k, v) for k, v in[(s, 0) for s in self.symbol_list])
-        d['datetime'] = self.start_date
-        return[d]
+        # Positions and market values as vectors in symbol_list order,
+        # the positions as floats since fills may be fractional
+        self.symbol_rows = dict((s, i) for i, s in enumerate(self.symbol_list))
+        self.position_vector = np.zeros(len(self.symbol_list))
+        self.market_values = np.zeros(len(self.symbol_list))
+        self.last_prices = np.full(len(self.symbol_list), np.nan)
+        self.positions_changed = np.ones(len(self.symbol_list), dtype=bool)
 
-    def construct_all_holdings(self):
+        # Rolling metrics, starting from the initial capital
+        self.rolling = None
+        if self.rolling_window is not None:
+            self.rolling = RollingMetrics(self.rolling_window, self.periods)
+            self.rolling.update(self.initial_capital)
+            if self.benchmark_symbol is not None and self.benchmark_symbol not in self.symbol_rows:
+                print("The benchmark symbol is not in the portfolio's symbol list.")
+                raise KeyError(self.benchmark_symbol)
+
+    def construct_ledger(self):
         """
-        Constructs the holdings list using the start_date
-        to determine when the time index will begin.
+        Constructs the positions and holdings ledger using the
+        start_date to determine when the time index will begin.
         """
-        d = dict((k, v) for k, v in[(s, 0.0) for s in self.symbol_list])
-        d['datetime'] = self.start_date
-        d['cash'] = self.initial_capital
-        d['commission'] = 0.0
-        d['total'] = self.initial_capital
-        return[d]
+        return Ledger(self.symbol_list, self.start_date, self.initial_capital)
 
     def construct_current_holdings(self):
         """
@@ -84,33 +115,35 @@ class Portfolio(object):
         Makes use of a MarketEvent from the events queue.
         """
         latest_datetime = self.bars.get_latest_bar_datetime(self.symbol_list[0])
- 
-        # Update positions
-        # ================
-        dp = dict((k, v) for k, v in[(s, 0) for s in self.symbol_list])
-        dp['datetime'] = latest_datetime
-        for s in self.symbol_list:
-            dp[s] = self.current_positions[s]
-
-        # Append the current positions
-        self.all_positions.append(dp)
-
-        # Update holdings
-        # ===============
-        dh = dict((k, v) for k, v in[(s, 0) for s in self.symbol_list])
-        dh['datetime'] = latest_datetime
-        dh['cash'] = self.current_holdings['cash']
-        dh['commission'] = self.current_holdings['commission']
-        dh['total'] = self.current_holdings['cash']
-        
-        for s in self.symbol_list:
-            # Approximation to the real value
-            market_value = self.current_positions[s] * self.bars.get_latest_bar_value(s, "Adj Close")
-            dh[s] = market_value
-            dh['total'] += market_value
+        prices = self.bars.get_latest_bar_vector("Adj Close")
+        positions = self.position_vector
+        market_values = self.market_values
+
+        # Mark to market (an approximation to the real value)
+        # ===================================================
+        if self.revalue_changed_only:
+            changed = (prices != self.last_prices) | self.positions_changed
+            market_values[changed] = positions[changed] * prices[changed]
+            self.last_prices[:] = prices
+            self.positions_changed[:] = False
+        else:
+            np.multiply(positions, prices, out=market_values)
+        # A flat symbol that has not printed yet has a NaN price,
+        # but holds no market value
+        market_values[positions == 0] = 0.0
+        total = self.current_holdings['cash'] + market_values.sum()
 
-        # Append the current holdings
-        self.all_holdings.append(dh)
+        # Append the positions and holdings to the ledger
+        self.ledger.record(
+            latest_datetime, positions, market_values,
+            self.current_holdings['cash'], self.current_holdings['commission'], total
+        )
+        self.stats.update(total)
+        if self.rolling is not None:
+            benchmark = np.nan
+            if self.benchmark_symbol is not None:
+                benchmark = prices[self.symbol_rows[self.benchmark_symbol]]
+            self.rolling.update(total, benchmark)
 
     def update_positions_from_fill(self, fill):
         """
@@ -129,6 +162,9 @@ class Portfolio(object):
         
         # Update positions list with new quantities
         self.current_positions[fill.symbol] += fill_dir * fill.quantity
+        row = self.symbol_rows[fill.symbol]
+        self.position_vector[row] = self.current_positions[fill.symbol]
+        self.positions_changed[row] = True
 
     def update_holdings_from_fill(self, fill):
         """
@@ -203,24 +239,34 @@ class Portfolio(object):
 
     def create_equity_curve_dataframe(self):
         """
-        Creates a pandas DataFrame from the all_holdings
-        list of dictionaries.
+        Creates a pandas DataFrame from the holdings in
+        the ledger.
         """
-        curve = pd.DataFrame(self.all_holdings)
-        curve.set_index('datetime', inplace=True)
+        curve = self.ledger.holdings_frame()
         curve['returns'] = curve['total'].pct_change()
         curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
         self.equity_curve = curve
 
-    def output_summary_stats(self):
+    def current_summary_stats(self):
         """
-        Creates a list of summary statistics for the portfolio.
+        Returns the summary statistics up to the latest bar, from
+        the streaming statistics rather than the equity curve.
+        """
+        return self.stats.summary_stats(self.periods)
+
+    def output_summary_stats(self, equity_path='equity.csv'):
+        """
+        Creates a list of summary statistics for the portfolio,
+        and saves the equity curve.
+        Parameters:
+        equity_path - The CSV file the equity curve is written to,
+        or None not to write it.
         """
-        total_return = self.equity_curve['equity_curve'][-1]
+        total_return = self.equity_curve['equity_curve'].iloc[-1]
         returns = self.equity_curve['returns']
         pnl = self.equity_curve['equity_curve']
         
-        sharpe_ratio = create_sharpe_ratio(returns, periods=252*6.5)
+        sharpe_ratio = create_sharpe_ratio(returns, periods=self.periods)
         drawdown, max_dd, dd_duration = create_drawdowns(pnl)
         self.equity_curve['drawdown'] = drawdown
         
@@ -228,6 +274,7 @@ class Portfolio(object):
                  ("Sharpe Ratio","%0.2f" % sharpe_ratio),
                  ("Max Drawdown","%0.2f%%" % (max_dd * 100.0)),
                  ("Drawdown Duration","%d" % dd_duration)]
-        self.equity_curve.to_csv('equity.csv')
+        if equity_path is not None:
+            self.equity_curve.to_csv(equity_path)
         return stats
         
\ No newline at end of file
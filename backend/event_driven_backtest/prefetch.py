@@ -0,0 +1,93 @@
+import queue
+import threading
+
+
+class _EndOfStream(object):
+    """
+    Marks the end of the wrapped iterator, carrying any exception
+    it raised so it can be re-raised on the consuming thread.
+    """
+    def __init__(self, error=None):
+        self.error = error
+
+
+class BackgroundPrefetcher(object):
+    """
+    BackgroundPrefetcher runs an iterator on a daemon thread and
+    hands its items to the consuming thread through a bounded
+    queue, so producing the next items (e.g. parsing and aligning
+    the next block of bars) overlaps with processing the current
+    one.
+
+    There is a single producer and the queue is FIFO, so the items
+    come out in exactly the order the iterator yields them and
+    results do not depend on thread timing.
+    """
+
+    def __init__(self, iterable, max_pending=4):
+        """
+        Starts prefetching.
+        Parameters:
+        iterable - The iterable to consume in the background.
+        max_pending - Maximum number of items produced ahead of
+        the consumer.
+        """
+        self.items = queue.Queue(maxsize=max_pending)
+        self.finished = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._produce, args=(iter(iterable),))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _produce(self, iterator):
+        """
+        Pushes items from the iterator until it is exhausted,
+        fails or the prefetcher is closed.
+        """
+        try:
+            for item in iterator:
+                if not self._put(item):
+                    return
+        except Exception as e:
+            self._put(_EndOfStream(e))
+        else:
+            self._put(_EndOfStream())
+
+    def _put(self, item):
+        """
+        Puts an item on the queue, waiting for room until the
+        prefetcher is closed. Returns False if it was closed.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """
+        Returns the next item, blocking until it is ready.
+        """
+        if self.finished:
+            raise StopIteration
+        item = self.items.get()
+        if isinstance(item, _EndOfStream):
+            self.finished = True
+            if item.error is not None:
+                raise item.error
+            raise StopIteration
+        return item
+
+    def close(self):
+        """
+        Stops the producer thread, early if the consumer has not
+        reached the end, and waits for it to exit.
+        """
+        self.finished = True
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,209 @@
+import collections
+import cProfile
+import io
+import pstats
+import signal
+import sys
+import threading
+
+
+def frame_label(frame):
+    """
+    Returns a 'module:qualified.name' label for a stack frame,
+    e.g. 'event_driven_backtest.portfolio:Portfolio.update_timeindex'.
+    """
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return "%s:%s" % (frame.f_globals.get("__name__", "?"), name)
+
+
+class StackSampler(object):
+    """
+    StackSampler is a sampling profiler. Every `interval` seconds it
+    counts the current stack of the profiled thread, so its cost
+    does not depend on how many calls that thread makes. The counts
+    are written in the collapsed-stack format ('root;caller;callee
+    count' per line) read by flame graph tools.
+
+    Where available, samples are taken by a SIGPROF interval timer
+    on CPU time, whose handler runs on the profiled (main) thread
+    between bytecodes. A sampling thread would only get the GIL when
+    the profiled thread releases it, e.g. in the heartbeat sleep,
+    which biases the stacks it sees, so it is only the fallback on
+    platforms without setitimer or off the main thread.
+    """
+
+    def __init__(self, interval=0.001):
+        """
+        Initialises the sampler.
+        Parameters:
+        interval - Seconds between samples.
+        """
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.previous_handler = None
+
+    def _record(self, frame):
+        """
+        Counts the stack ending at frame.
+        """
+        labels = []
+        while frame is not None:
+            labels.append(frame_label(frame))
+            frame = frame.f_back
+        if labels:
+            self.stacks[";".join(reversed(labels))] += 1
+
+    def _on_signal(self, signum, frame):
+        """
+        SIGPROF handler, sampling the interrupted frame.
+        """
+        self._record(frame)
+
+    def start(self):
+        """
+        Starts sampling the calling thread.
+        """
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            self.previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._sample, args=(threading.get_ident(),))
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        """
+        Stops sampling. Samples accumulate across start/stop pairs.
+        """
+        if self.thread is None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler)
+        else:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+
+    def _sample(self, thread_id):
+        """
+        Records the stack of the profiled thread until stopped.
+        """
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def write_collapsed(self, path):
+        """
+        Writes the sampled stacks in collapsed-stack format.
+        """
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write("%s %d\n" % (stack, count))
+
+    def function_totals(self):
+        """
+        Returns {label: (self samples, total samples)}, counting a
+        function once per sample it appears in.
+        """
+        totals = {}
+        for stack, count in self.stacks.items():
+            labels = stack.split(";")
+            for label in set(labels):
+                own, total = totals.get(label, (0, 0))
+                totals[label] = (own, total + count)
+            own, total = totals[labels[-1]]
+            totals[labels[-1]] = (own + count, total)
+        return totals
+
+
+class Profiler(object):
+    """
+    Profiler wraps (possibly several) backtest runs in a deep
+    profiler, in one of two modes:
+    'deterministic' - cProfile records every call. Its statistics
+    are written to <path>.prof (for pstats, snakeviz etc.) and, as
+    text sorted by cumulative time, to <path>.txt.
+    'sampling' - Only a StackSampler runs, with a far lower overhead.
+    The busiest functions are written to <path>.txt.
+
+    cProfile records call edges rather than whole stacks, so in both
+    modes a StackSampler also writes <path>.collapsed for flame
+    graph tools; in deterministic mode it samples at the coarser
+    `collapsed_interval` to stay out of the way.
+    """
+
+    def __init__(self, mode='deterministic', path="profile", interval=0.001,
+                 collapsed_interval=0.01):
+        """
+        Initialises the profiler.
+        Parameters:
+        mode - 'deterministic' or 'sampling'.
+        path - Output path prefix.
+        interval - Seconds between samples in sampling mode.
+        collapsed_interval - Seconds between samples in deterministic mode.
+        """
+        if mode not in ('deterministic', 'sampling'):
+            raise ValueError("mode must be 'deterministic' or 'sampling', not %r" % mode)
+        self.mode = mode
+        self.path = path
+        if mode == 'deterministic':
+            self.profile = cProfile.Profile()
+            self.sampler = StackSampler(collapsed_interval)
+        else:
+            self.profile = None
+            self.sampler = StackSampler(interval)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def start(self):
+        """
+        Starts profiling the calling thread.
+        """
+        self.sampler.start()
+        if self.profile is not None:
+            self.profile.enable()
+
+    def stop(self):
+        """
+        Stops profiling. Statistics accumulate across start/stop pairs.
+        """
+        if self.profile is not None:
+            self.profile.disable()
+        self.sampler.stop()
+
+    def write(self, limit=50):
+        """
+        Writes the profiler output files and returns their paths.
+        Parameters:
+        limit - Number of functions listed in the text summary.
+        """
+        paths = [self.path + ".txt", self.path + ".collapsed"]
+        self.sampler.write_collapsed(self.path + ".collapsed")
+        if self.profile is not None:
+            self.profile.dump_stats(self.path + ".prof")
+            paths.append(self.path + ".prof")
+            text = io.StringIO()
+            pstats.Stats(self.profile, stream=text).sort_stats("cumulative").print_stats(limit)
+            summary = text.getvalue()
+        else:
+            totals = self.sampler.function_totals()
+            n = max(sum(self.sampler.stacks.values()), 1)
+            lines = ["%8s %8s  %s" % ("self%", "total%", "function")]
+            for label, (own, total) in sorted(
+                totals.items(), key=lambda kv: kv[1][1], reverse=True
+            )[:limit]:
+                lines.append("%8.2f %8.2f  %s" % (100.0 * own / n, 100.0 * total / n, label))
+            summary = "%d samples\n%s\n" % (n, "\n".join(lines))
+        with open(self.path + ".txt", "w") as f:
+            f.write(summary)
+        return paths
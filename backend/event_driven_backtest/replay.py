@@ -0,0 +1,167 @@
+import pandas as pd
+from event_driven_backtest.event import EventType, MarketEvent
+from event_driven_backtest.data import RingBufferDataHandler
+from event_driven_backtest.strategy import Strategy
+from event_driven_backtest.backtest import Backtest
+from event_driven_backtest.bar_store import RingBarBuffer
+from event_driven_backtest.execution import SimulatedExecutionHandler
+from event_driven_backtest.portfolio import Portfolio
+from event_driven_backtest.journal import (
+    NEW_BAR, TZ_AWARE, read_journal_header, iter_journal
+)
+
+
+class JournalDataHandler(RingBufferDataHandler):
+    """
+    JournalDataHandler replays the bars recorded in an EventJournal,
+    so that a portfolio can be rebuilt without the original data
+    handler or strategy.
+
+    Each update_bars() call drips the next recorded bar and puts its
+    MarketEvent on the bus, followed by the recorded events that
+    came after it: the SIGNAL events in 'signals' mode, which the
+    portfolio sizes and the execution handler fills afresh, or the
+    FILL events in 'fills' mode, which are applied as recorded.
+    Only the recorded field ('Adj Close') is available.
+    """
+
+    symbol_error = "That symbol is not available in the journal."
+
+    def __init__(self, events, symbol_list, start, end, journal_path=None,
+                 mode='signals', max_bars=None):
+        """
+        Opens the journal.
+        Parameters:
+        events - The Event Queue.
+        symbol_list - A list of symbol strings, as recorded in the journal.
+        journal_path - The journal file path.
+        mode - 'signals' or 'fills'.
+        max_bars - Number of latest bars kept per symbol.
+        """
+        if mode not in ('signals', 'fills'):
+            raise ValueError("mode must be 'signals' or 'fills', not %r" % mode)
+        self.events = events
+        self.symbol_list = symbol_list
+        self.start = start
+        self.end = end
+        self.journal_path = journal_path
+        self.replayed_kind = EventType.SIGNAL if mode == 'signals' else EventType.FILL
+        self.max_bars = max_bars
+        self.continue_backtest = True
+        self._open_convert_csv_files()
+
+    def _open_convert_csv_files(self):
+        """
+        Reads the journal header and primes the record stream.
+        """
+        self.file = open(self.journal_path, "rb")
+        self.header = read_journal_header(self.file)
+        if list(self.symbol_list) != self.header["symbols"]:
+            raise ValueError(
+                "symbol_list %s does not match the journal's %s"
+                % (self.symbol_list, self.header["symbols"])
+            )
+        self.val_type = self.header["val_type"]
+        self.records = iter_journal(self.file, self.header["symbols"])
+        self.next_record = next(self.records, None)
+        self.tz_aware = False
+        self.fields = [self.val_type]
+        self.bar_buffer = RingBarBuffer(self.symbol_list, self.fields, self.max_bars or 1)
+
+    def _check_symbol(self, symbol, val_type=None):
+        """
+        Raises a KeyError for symbols or fields outside the journal.
+        """
+        RingBufferDataHandler._check_symbol(self, symbol)
+        if val_type is not None and val_type != self.val_type:
+            print("Only %s is recorded in the journal." % self.val_type)
+            raise KeyError(val_type)
+
+    def get_latest_bar_datetime(self, symbol):
+        """
+        Returns the recorded time of the last bar.
+        """
+        self._check_symbol(symbol)
+        latest = self.bar_buffer.latest_datetime()
+        return latest.tz_localize("UTC") if self.tz_aware else latest
+
+    def update_bars(self):
+        """
+        Drips the next recorded bar and puts its MarketEvent on the
+        bus, followed by the recorded events replayed in this mode.
+        The final MARKET record of a run carries no new bar.
+        """
+        record = self.next_record
+        if record is None:
+            self.continue_backtest = False
+        else:
+            ts, flags, prices = record[1]
+            if flags & NEW_BAR:
+                self.bar_buffer.append(ts, prices[:, None])
+                self.tz_aware = bool(flags & TZ_AWARE)
+            else:
+                self.continue_backtest = False
+        self.events.put(MarketEvent())
+
+        self.next_record = next(self.records, None)
+        while self.next_record is not None and self.next_record[0] != EventType.MARKET:
+            if self.next_record[0] == self.replayed_kind:
+                self.events.put(self.next_record[1])
+            self.next_record = next(self.records, None)
+        if not self.continue_backtest:
+            self.file.close()
+
+
+class JournalStrategy(Strategy):
+    """
+    A strategy generating no signals, for replays where the signals
+    come from the journal.
+    """
+    def __init__(self, bars, events):
+        """
+        Initialises the strategy.
+        Parameters:
+        bars - The JournalDataHandler.
+        events - The Event Queue.
+        """
+        self.bars = bars
+        self.events = events
+
+    def calculate_signals(self, event):
+        """
+        Replayed signals are put on the bus by JournalDataHandler.
+        """
+        pass
+
+
+def replay_journal(journal_path, portfolio=Portfolio, execution_handler=SimulatedExecutionHandler,
+                   mode='signals', initial_capital=None):
+    """
+    Rebuilds a portfolio from an EventJournal without the original
+    data handler or strategy, and returns the finished Backtest,
+    whose portfolio holds the equity curve. In 'signals' mode the
+    recorded signals go through the given portfolio's sizing and
+    execution handler's commission model, so accounting changes can
+    be evaluated in seconds; in 'fills' mode the recorded fills are
+    applied as they were.
+    Parameters:
+    journal_path - The journal file path.
+    portfolio - (Class) The Portfolio to rebuild.
+    execution_handler - (Class) Fills the replayed orders.
+    mode - 'signals' or 'fills'.
+    initial_capital - Starting capital, defaulting to the recorded one.
+    """
+    with open(journal_path, "rb") as f:
+        header = read_journal_header(f)
+    if initial_capital is None:
+        initial_capital = header["initial_capital"]
+    backtest = Backtest(
+        header["symbols"], initial_capital, 0.0,
+        pd.Timestamp(header["start_date"]).to_pydatetime(), None,
+        JournalDataHandler, execution_handler, portfolio, JournalStrategy,
+        data_handler_params=dict(journal_path=journal_path, mode=mode),
+        latency_report_path=None
+    )
+    backtest._run_backtest()
+    backtest.portfolio.create_equity_curve_dataframe()
+    return backtest
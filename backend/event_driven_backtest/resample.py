@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from event_driven_backtest.bar_store import RingBarBuffer
+
+
+def timeframe_to_ns(timeframe):
+    """
+    Converts a timeframe string such as '5m', '1h' or '1d'
+    into nanoseconds.
+    """
+    if timeframe.endswith('d'):
+        timeframe = timeframe[:-1] + 'D'
+    return pd.Timedelta(timeframe).value
+
+
+class IncrementalResampler(object):
+    """
+    IncrementalResampler builds coarser bars (e.g. 5m, 1h, 1d) from
+    a stream of finer bars, one fine bar at a time, without ever
+    recomputing from the history.
+
+    Bars are bucketed on UTC boundaries of the timeframe and
+    stamped with the start of their bucket. Open takes the first
+    value of the bucket, High the maximum, Low the minimum, Volume
+    the sum, and every other field the last value. The bar still
+    being built is kept as the latest bar of each symbol's
+    RingBarBuffer and refreshed in place, so windows are views that
+    include it.
+    """
+
+    def __init__(self, symbol_list, fields, timeframe, capacity):
+        """
+        Initialises the resampler.
+        Parameters:
+        symbol_list - A list of symbol strings.
+        fields - The field names of the incoming bars.
+        timeframe - The coarser timeframe, e.g. '5m', '1h' or '1d'.
+        capacity - The number of resampled bars kept per symbol.
+        """
+        self.timeframe = timeframe
+        self.timeframe_ns = timeframe_to_ns(timeframe)
+        self.fields = list(fields)
+        self.buffers = {}
+        self.buckets = {}
+        self.partial_bars = {}
+        for s in symbol_list:
+            self.buffers[s] = RingBarBuffer([s], self.fields, capacity)
+            self.buckets[s] = None
+            self.partial_bars[s] = np.full((1, len(self.fields)), np.nan)
+
+        self.max_cols = [j for j, f in enumerate(self.fields) if f == 'High']
+        self.min_cols = [j for j, f in enumerate(self.fields) if f == 'Low']
+        self.sum_cols = [j for j, f in enumerate(self.fields) if f == 'Volume']
+        self.last_cols = [
+            j for j, f in enumerate(self.fields) if f not in ('Open', 'High', 'Low', 'Volume')
+        ]
+
+    def update(self, symbol, timestamp, values):
+        """
+        Folds one fine bar into the resampled bars of a symbol.
+        Parameters:
+        symbol - The symbol the bar belongs to.
+        timestamp - The bar time as integer UTC nanoseconds.
+        values - The bar values, in the order of fields.
+        """
+        bucket = timestamp - timestamp % self.timeframe_ns
+        bar = self.partial_bars[symbol]
+        if bucket != self.buckets[symbol]:
+            self.buckets[symbol] = bucket
+            bar[0] = values
+            self.buffers[symbol].append(bucket, bar)
+        else:
+            row = bar[0]
+            row[self.max_cols] = np.fmax(row[self.max_cols], values[self.max_cols])
+            row[self.min_cols] = np.fmin(row[self.min_cols], values[self.min_cols])
+            row[self.sum_cols] += values[self.sum_cols]
+            row[self.last_cols] = values[self.last_cols]
+            self.buffers[symbol].update_last(bar)
+
+    def get_buffer(self, symbol):
+        """
+        Returns the RingBarBuffer holding the resampled bars of a symbol.
+        """
+        return self.buffers[symbol]
@@ -0,0 +1,158 @@
+import collections
+import math
+import numpy as np
+import pandas as pd
+
+
+class RollingMetrics(object):
+    """
+    RollingMetrics keeps the rolling Sharpe ratio, volatility,
+    drawdown and beta against a benchmark of an equity curve over
+    the last `window` bars, updated in O(1) per bar.
+
+    The moments of the returns (and of the benchmark returns) are
+    fixed-window sliding sums, recomputed exactly from the window
+    once every `window` bars so that rounding errors cannot build
+    up. The rolling maximum of the curve, from which the drawdown
+    is measured, is kept in a monotonic deque.
+
+    It runs in streaming mode, with update() called once per bar
+    (see Portfolio.rolling_window), or in batch mode over a saved
+    curve with rolling_metrics(). As with pandas' rolling(), the
+    metrics are NaN until the window is full. Bars whose return is
+    NaN are left out of the return window.
+    """
+
+    def __init__(self, window, periods=252):
+        """
+        Initialises the engine.
+        Parameters:
+        window - Number of bars in the window.
+        periods - Bars per year, used to annualise.
+        """
+        self.window = window
+        self.periods = periods
+        self.returns = collections.deque()
+        self.sums = [0.0] * 5  # r, r^2, b, b^2, r*b
+        self.updates = 0
+        self.missing = 0  # NaN benchmark returns in the window
+        self.peaks = collections.deque()  # (bar, total), totals decreasing
+        self.bar = 0
+        self.last_total = np.nan
+        self.last_benchmark = np.nan
+        self.drawdown_value = np.nan
+
+    def update(self, total, benchmark=np.nan):
+        """
+        Adds one bar.
+        Parameters:
+        total - The portfolio total at the bar.
+        benchmark - The benchmark price or total at the bar, if any.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = total / self.last_total - 1.0
+            b = benchmark / self.last_benchmark - 1.0
+        self.last_total = total
+        self.last_benchmark = benchmark
+
+        # Sliding sums of the returns
+        if not math.isnan(r):
+            terms = (r, r * r, b, b * b, r * b)
+            self.returns.append(terms)
+            self.sums = [s + t for s, t in zip(self.sums, terms)]
+            self.updates += 1
+            if math.isnan(b):
+                self.missing += 1
+            if len(self.returns) > self.window:
+                old = self.returns.popleft()
+                self.sums = [s - t for s, t in zip(self.sums, old)]
+                if math.isnan(old[2]):
+                    self.missing -= 1
+                    if self.missing == 0:
+                        # The benchmark sums stay NaN until recomputed
+                        self.updates = 0
+            if self.updates % self.window == 0:
+                self.sums = [math.fsum(column) for column in zip(*self.returns)]
+
+        # Rolling maximum of the curve
+        peaks = self.peaks
+        while peaks and not peaks[-1][1] > total:
+            peaks.pop()
+        peaks.append((self.bar, total))
+        if peaks[0][0] <= self.bar - self.window:
+            peaks.popleft()
+        self.bar += 1
+        if self.bar >= self.window:
+            self.drawdown_value = 1.0 - total / peaks[0][1]
+
+    def values(self):
+        """
+        Returns (sharpe, volatility, drawdown, beta) at the latest bar.
+        The volatility is the annualised sample standard deviation of
+        the returns in the window, the drawdown the fall of the curve
+        from its highest value in the window, as a fraction of it.
+        """
+        n = len(self.returns)
+        if n < self.window or n < 2:
+            return np.nan, np.nan, self.drawdown_value, np.nan
+        s_r, s_rr, s_b, s_bb, s_rb = self.sums
+        var_r = max(s_rr - s_r * s_r / n, 0.0) / (n - 1)
+        var_b = max(s_bb - s_b * s_b / n, 0.0) / (n - 1)
+        cov = (s_rb - s_r * s_b / n) / (n - 1)
+        sharpe = math.sqrt(self.periods) * s_r / n / math.sqrt(var_r) if var_r > 0 else np.nan
+        beta = cov / var_b if var_b > 0 else np.nan
+        return sharpe, math.sqrt(self.periods * var_r), self.drawdown_value, beta
+
+    def sharpe_ratio(self):
+        """
+        Returns the annualised Sharpe ratio of the returns in the
+        window, against a benchmark of zero.
+        """
+        return self.values()[0]
+
+    def volatility(self):
+        """
+        Returns the annualised volatility of the returns in the window.
+        """
+        return self.values()[1]
+
+    def drawdown(self):
+        """
+        Returns the drawdown from the highest value in the window.
+        """
+        return self.drawdown_value
+
+    def beta(self):
+        """
+        Returns the beta of the returns against the benchmark
+        returns in the window.
+        """
+        return self.values()[3]
+
+
+def rolling_metrics(totals, window, periods=252, benchmark=None):
+    """
+    Runs RollingMetrics over a saved curve and returns a DataFrame
+    of the rolling sharpe, volatility, drawdown and beta at every bar.
+    Parameters:
+    totals - The portfolio totals, e.g. equity_curve['total'].
+    window - Number of bars in the window.
+    periods - Bars per year, used to annualise.
+    benchmark - Optional benchmark prices or totals on the same bars.
+    """
+    index = totals.index if isinstance(totals, pd.Series) else None
+    totals = np.asarray(totals, dtype=float)
+    if benchmark is None:
+        benchmark = np.full(len(totals), np.nan)
+    benchmark = np.asarray(benchmark, dtype=float)
+    if len(benchmark) != len(totals):
+        raise ValueError(
+            "benchmark has %d bars, the curve %d" % (len(benchmark), len(totals))
+        )
+
+    engine = RollingMetrics(window, periods)
+    out = np.empty((len(totals), 4))
+    for i in range(len(totals)):
+        engine.update(totals[i], benchmark[i])
+        out[i] = engine.values()
+    return pd.DataFrame(out, index=index, columns=["sharpe", "volatility", "drawdown", "beta"])
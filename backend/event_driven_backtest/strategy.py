@@ -19,9 +19,37 @@ class Strategy(object):
 
     __metaclass__ = ABCMeta
 
+    # Attributes holding the state carried from bar to bar, saved
+    # by checkpoints (see checkpoint.py)
+    checkpoint_attrs = ()
+
     @abstractmethod
     def calculate_signals(self):
         """
         Provides the mechanisms to calculate the list of signals.
         """
         raise NotImplementedError("Should implement calculate_signals()")
+
+    def get_lookback(self):
+        """
+        Returns the largest number of bars the strategy requests
+        from the DataHandler at once, or None if it does not say.
+        """
+        return None
+
+    def calculate_signals_batch(self, K):
+        """
+        Optional hook for block-batched backtests. It is called on
+        the first bar of a block, with that bar already dripped,
+        and may read up to K-1 upcoming bars through
+        DataHandler.peek_bars_matrix() to compute the block's
+        indicators at once. It must only use, for each bar, the
+        bars up to and including it.
+
+        Returns a list with one list of SignalEvents per bar of the
+        block, starting with the current bar, which the Backtest
+        hands to the portfolio bar by bar. Returning None, as the
+        default does, falls back to calculate_signals() for the
+        current bar.
+        """
+        return None
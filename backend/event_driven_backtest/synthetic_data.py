@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from event_driven_backtest.data import BlockDataHandler, DEFAULT_MAX_BARS
+from event_driven_backtest.bar_store import RingBarBuffer
+from event_driven_backtest.bar_cache import to_utc_ns
+from event_driven_backtest.prefetch import BackgroundPrefetcher
+
+BAR_FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+def synthetic_symbols(n):
+    """
+    Returns a list of n placeholder symbol strings.
+    """
+    return ["SYM%05d" % i for i in range(n)]
+
+
+class SyntheticDataHandler(BlockDataHandler):
+    """
+    SyntheticDataHandler generates deterministic, seeded OHLCV bars
+    so that strategies, portfolios and metrics can be exercised at
+    scale without any market data download.
+
+    Log prices follow one of three processes:
+    'gbm' - Geometric Brownian Motion with drift mu and volatility sigma.
+    'ou' - A mean-reverting Ornstein-Uhlenbeck process, reverting
+    at rate theta towards the initial price.
+    'coint' - Symbols are taken in consecutive pairs (x, y), where x
+    is a GBM and y = beta * x plus an OU spread, giving a
+    cointegrated pair. A trailing odd symbol is a plain GBM.
+
+    Bars are generated block_size at a time across all symbols and
+    dripped one at a time into a RingBarBuffer, so neither the
+    full history nor the full universe history is ever held.
+
+    The shocks, wicks and volumes are each drawn from their own
+    random number generator, bar by bar across the symbols, and the
+    paths are accumulated bar by bar, so the bars depend only on the
+    seed: block_size only affects performance, and a run over fewer
+    bars is a prefix of one over more.
+    """
+    symbol_error = "That symbol is not available in the synthetic data set."
+
+    def __init__(self, events, symbol_list, start, end, process='gbm',
+                 freq='1D', n_bars=None, seed=42, block_size=1024,
+                 mu=0.05, sigma=0.2, theta=5.0, beta=1.0,
+                 initial_price=100.0, max_bars=None, prefetch=False):
+        """
+        Initialises the synthetic data handler.
+        Parameters:
+        events - The Event Queue.
+        symbol_list - A list of symbol strings.
+        start - The timestamp of the first bar.
+        end - The timestamp to stop at (exclusive), unless n_bars is given.
+        process - 'gbm', 'ou' or 'coint'.
+        freq - The bar spacing, e.g. '1D' or '1min'.
+        n_bars - Optional number of bars, overriding end.
+        seed - Seed of the random number generator.
+        block_size - Number of bars generated per vectorised block.
+        mu - Annualised drift of the GBM processes.
+        sigma - Annualised volatility of every process.
+        theta - Annualised mean reversion rate of the OU processes.
+        beta - Hedge ratio of the cointegrated pairs.
+        initial_price - Price of every symbol at the first bar.
+        max_bars - Number of latest bars kept per symbol. Defaults to
+        the largest lookback declared through set_lookback().
+        prefetch - Whether to generate blocks on a background thread.
+        The thread then advances the random number generator and the
+        process state (the generators, log_prices, spreads), so they should only
+        be read from another thread after close(). The blocks, and so
+        the bars, are the same either way.
+        """
+        if process not in ('gbm', 'ou', 'coint'):
+            raise ValueError("process must be 'gbm', 'ou' or 'coint', not %r" % process)
+        self.events = events
+        self.symbol_list = symbol_list
+        self.start = start
+        self.end = end
+        self.process = process
+        self.step_ns = pd.Timedelta(freq).value
+        self.start_ns = to_utc_ns(start)
+        if n_bars is None:
+            n_bars = max((to_utc_ns(end) - self.start_ns) // self.step_ns, 0)
+        self.n_bars = n_bars
+        self.block_size = block_size
+        self.mu = mu
+        self.sigma = sigma
+        self.theta = theta
+        self.beta = beta
+        self.initial_price = initial_price
+        self.max_bars = max_bars
+        self.prefetch = prefetch
+        self.shock_rng, self.wick_rng, self.volume_rng = [
+            np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(3)
+        ]
+
+        # Time step as a fraction of a 252-day trading year
+        self.dt = self.step_ns / (pd.Timedelta('1D').value * 252.0)
+        self.fields = BAR_FIELDS
+        self.continue_backtest = True
+        self._open_convert_csv_files()
+
+    def _open_convert_csv_files(self):
+        """
+        Sets up the block generator and the ring buffer.
+        """
+        n = len(self.symbol_list)
+        self.log_prices = np.zeros(n)
+        self.spreads = np.zeros(n // 2)
+        self.symbol_data = self._iter_blocks()
+        if self.prefetch:
+            self.symbol_data = BackgroundPrefetcher(self.symbol_data)
+        self.block = None
+        self.block_pos = 0
+        self.bar_buffer = RingBarBuffer(
+            self.symbol_list, self.fields, self.max_bars or DEFAULT_MAX_BARS
+        )
+
+    def _gbm_paths(self, last, shocks):
+        """
+        Returns GBM log price paths (relative to the initial price)
+        continuing from last, one row per path. The steps are summed
+        onto last one at a time, so a path does not depend on where
+        the blocks split it.
+        """
+        steps = (self.mu - 0.5 * self.sigma ** 2) * self.dt + self.sigma * np.sqrt(self.dt) * shocks
+        return np.cumsum(np.concatenate([last[:, None], steps], axis=1), axis=1)[:, 1:]
+
+    def _ou_paths(self, last, shocks):
+        """
+        Returns OU paths reverting to zero, continuing from last, one
+        row per path, using the exact discretisation of the process.
+        The recursion runs along the block, vectorised across paths.
+        """
+        a = np.exp(-self.theta * self.dt)
+        scale = self.sigma * np.sqrt((1.0 - a ** 2) / (2.0 * self.theta))
+        paths = np.empty_like(shocks)
+        x = last
+        for k in range(shocks.shape[1]):
+            x = a * x + scale * shocks[:, k]
+            paths[:, k] = x
+        return paths
+
+    def _log_price_block(self, n_steps):
+        """
+        Returns the next (symbols x n_steps) block of log prices
+        relative to the initial price.
+        """
+        n = len(self.symbol_list)
+        shocks = self.shock_rng.standard_normal((n_steps, n)).T
+        if self.process == 'gbm':
+            return self._gbm_paths(self.log_prices, shocks)
+        if self.process == 'ou':
+            return self._ou_paths(self.log_prices, shocks)
+
+        # Cointegrated pairs: x is a GBM and y = beta * x + OU spread
+        n_pairs = n // 2
+        block = self._gbm_paths(self.log_prices, shocks)
+        x = block[0:2 * n_pairs:2]
+        spreads = self._ou_paths(self.spreads, shocks[1:2 * n_pairs:2])
+        block[1:2 * n_pairs:2] = self.beta * x + spreads
+        self.spreads = spreads[:, -1]
+        return block
+
+    def _iter_blocks(self):
+        """
+        Yields (timestamps, values) blocks, where values has shape
+        (bars x symbols x fields) in BAR_FIELDS order.
+        """
+        n = len(self.symbol_list)
+        for first in range(0, self.n_bars, self.block_size):
+            n_steps = min(self.block_size, self.n_bars - first)
+            log_prices = self._log_price_block(n_steps)
+
+            opens = self.initial_price * np.exp(
+                np.concatenate([self.log_prices[:, None], log_prices[:, :-1]], axis=1)
+            )
+            closes = self.initial_price * np.exp(log_prices)
+            self.log_prices = log_prices[:, -1]
+
+            wicks = np.abs(self.wick_rng.standard_normal((n_steps, 2, n))) * self.sigma * np.sqrt(self.dt)
+            opens, closes = opens.T, closes.T
+            values = np.empty((n_steps, n, len(self.fields)))
+            values[:, :, 0] = opens
+            values[:, :, 1] = np.maximum(opens, closes) * (1.0 + wicks[:, 0])
+            values[:, :, 2] = np.minimum(opens, closes) * (1.0 - wicks[:, 1])
+            values[:, :, 3] = closes
+            values[:, :, 4] = closes
+            values[:, :, 5] = np.floor(self.volume_rng.lognormal(13.0, 0.5, (n_steps, n)))
+
+            timestamps = self.start_ns + self.step_ns * np.arange(first, first + n_steps, dtype=np.int64)
+            yield timestamps, values
@@ -0,0 +1,301 @@
+import numpy as np
+import pandas as pd
+from event_driven_backtest.event import FillEvent
+from event_driven_backtest.performance import create_sharpe_ratio, create_drawdowns
+
+# Signal codes of a signals matrix, matching SignalEvent.signal_type
+SIGNAL_NONE = 0
+SIGNAL_LONG = 1
+SIGNAL_SHORT = 2
+SIGNAL_EXIT = 3
+
+
+def collect_prices(bars, val_type="Adj Close"):
+    """
+    Drains a DataHandler and returns the aligned values of val_type
+    it dripped as a (bars x symbols) DataFrame, so that a vectorised
+    run sees exactly the data of an event-driven one.
+    """
+    index, rows = [], []
+    while True:
+        bars.update_bars()
+        if not bars.continue_backtest:
+            break
+        index.append(bars.get_latest_bar_datetime(bars.symbol_list[0]))
+        rows.append([bars.get_latest_bar_value(s, val_type) for s in bars.symbol_list])
+    return pd.DataFrame(rows, index=index, columns=bars.symbol_list, dtype=np.float64)
+
+
+def _rolling_sum(values, window):
+    """
+    Returns the sum of the last `window` values at each row, or of
+    all values so far while fewer are available.
+    """
+    csum = np.cumsum(values, axis=0)
+    out = csum.copy()
+    out[window:] -= csum[:-window]
+    return out
+
+
+def _forward_fill_state(state):
+    """
+    Replaces -1 entries of a (bars x symbols) state matrix with the
+    last non-negative value above them, starting from 0.
+    """
+    n = state.shape[0]
+    idx = np.where(state >= 0, np.arange(n)[:, None], -1)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    filled = np.take_along_axis(state, np.maximum(idx, 0), axis=0)
+    return np.where(idx >= 0, filled, 0)
+
+
+def sma_crossover_signals(prices, short_window=100, long_window=400):
+    """
+    Whole-history equivalent of MovingAverageCrossStrategy. At each
+    bar the short and long simple moving averages are taken over the
+    latest short_window/long_window bars (or all bars so far, if
+    fewer), a LONG is issued when the short crosses above the long
+    while out of the market, and an EXIT when it crosses below while
+    long. As in the strategy (see nan_row_means), each average is taken
+    over the non-NaN bars of its window, so a symbol that has not listed
+    yet has a NaN average, which never triggers a signal.
+    Parameters:
+    prices - A (bars x symbols) array of prices.
+    short_window - The short moving average lookback.
+    long_window - The long moving average lookback.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    valid = ~np.isnan(prices)
+    values = np.where(valid, prices, 0.0)
+
+    # While both windows hold the same valid bars, their sums and
+    # counts are equal, so the averages compare as equal as they must
+    with np.errstate(invalid='ignore', divide='ignore'):
+        long_sma = _rolling_sum(values, long_window) / _rolling_sum(valid, long_window)
+        if short_window >= long_window:
+            short_sma = long_sma
+        else:
+            short_sma = _rolling_sum(values, short_window) / _rolling_sum(valid, short_window)
+
+    state = np.where(short_sma > long_sma, 1, np.where(short_sma < long_sma, 0, -1))
+    state = _forward_fill_state(state)
+    change = np.diff(state, axis=0, prepend=0)
+
+    signals = np.zeros(prices.shape, dtype=np.int8)
+    signals[change > 0] = SIGNAL_LONG
+    signals[change < 0] = SIGNAL_EXIT
+    return signals
+
+
+def ols_pairs_zscores(y, x, ols_window=100, chunk_size=4096):
+    """
+    Returns the z-score of the latest spread y - beta * x at each
+    bar, where beta is the hedge ratio of a rolling OLS regression
+    of y on x without intercept over the latest ols_window bars, as
+    in IntradayOLSMRStrategy. Bars with fewer than ols_window bars
+    of history are NaN.
+
+    Each window is regressed and scored on its own values, as the
+    strategy does, rather than from differences of running sums,
+    whose rounding error grows with the length of the history. The
+    windows are strided views, taken chunk_size bars at a time to
+    bound memory.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    zscores = np.full(len(y), np.nan)
+    if len(y) < ols_window:
+        return zscores
+    y_windows = np.lib.stride_tricks.sliding_window_view(y, ols_window)
+    x_windows = np.lib.stride_tricks.sliding_window_view(x, ols_window)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for lo in range(0, len(y_windows), chunk_size):
+            yw = y_windows[lo:lo + chunk_size]
+            xw = x_windows[lo:lo + chunk_size]
+            beta = (xw * yw).sum(axis=1) / (xw * xw).sum(axis=1)
+            spread = yw - beta[:, None] * xw
+            end = lo + ols_window - 1
+            zscores[end:end + len(yw)] = (
+                (spread[:, -1] - spread.mean(axis=1)) / spread.std(axis=1)
+            )
+    return zscores
+
+
+def ols_pairs_signals(prices, pair, ols_window=100, zscore_high=3.0, zscore_low=0.5):
+    """
+    Whole-history equivalent of IntradayOLSMRStrategy. The z-scores
+    are computed for every bar at once; the entry/exit state machine
+    then only visits the bars where a threshold is crossed.
+    Parameters:
+    prices - A (bars x symbols) DataFrame of prices.
+    pair - The (y, x) symbols of the pair.
+    ols_window - The rolling regression lookback.
+    zscore_high - The entry threshold.
+    zscore_low - The exit threshold.
+    """
+    columns = list(prices.columns)
+    p0, p1 = columns.index(pair[0]), columns.index(pair[1])
+    zscores = ols_pairs_zscores(prices[pair[0]].values, prices[pair[1]].values, ols_window)
+
+    signals = np.zeros(prices.shape, dtype=np.int8)
+    long_market = short_market = False
+    with np.errstate(invalid='ignore'):
+        candidates = np.flatnonzero(
+            (np.abs(zscores) >= zscore_high) | (np.abs(zscores) <= zscore_low)
+        )
+    for t in candidates:
+        z = zscores[t]
+        pair_signal = None
+        if z <= -zscore_high and not long_market:
+            long_market = True
+            pair_signal = (SIGNAL_LONG, SIGNAL_SHORT)
+        if abs(z) <= zscore_low and long_market:
+            long_market = False
+            pair_signal = (SIGNAL_EXIT, SIGNAL_EXIT)
+        if z >= zscore_high and not short_market:
+            short_market = True
+            pair_signal = (SIGNAL_SHORT, SIGNAL_LONG)
+        if abs(z) <= zscore_low and short_market:
+            short_market = False
+            pair_signal = (SIGNAL_EXIT, SIGNAL_EXIT)
+        if pair_signal is not None:
+            signals[t, p0], signals[t, p1] = pair_signal
+    return signals
+
+
+class VectorizedBacktest(object):
+    """
+    Runs a strategy expressed as a whole-history signals matrix in
+    NumPy, reproducing the accounting of the event-driven Backtest
+    with Portfolio and SimulatedExecutionHandler: naive fixed-size
+    orders, fills at the bar's price with Interactive Brokers
+    commission, and holdings recorded before each bar's fills. The
+    resulting equity_curve has the same rows and columns as
+    Portfolio.equity_curve.
+    """
+
+    def __init__(self, prices, start_date, initial_capital=100000.0,
+                 quantity=100, periods=252*6.5):
+        """
+        Initialises the vectorised backtest.
+        Parameters:
+        prices - A (bars x symbols) DataFrame of fill/valuation prices.
+        start_date - The start date (bar) of the portfolio.
+        initial_capital - The starting capital in USD.
+        quantity - The fixed order size of the naive order sizing.
+        periods - Number of bars per year, for the Sharpe ratio.
+        """
+        self.prices = prices
+        self.symbol_list = list(prices.columns)
+        self.start_date = start_date
+        self.initial_capital = initial_capital
+        self.quantity = quantity
+        self.periods = periods
+
+    def generate_naive_trades(self, signals):
+        """
+        Applies Portfolio.generate_naive_order to a signals matrix,
+        returning the signed quantity filled per bar and symbol.
+        Only the bars carrying a signal are visited.
+        """
+        trades = np.zeros(signals.shape, dtype=np.int64)
+        current = np.zeros(signals.shape[1], dtype=np.int64)
+        for t, j in zip(*np.nonzero(signals)):
+            signal, cur = signals[t, j], current[j]
+            if signal == SIGNAL_LONG and cur == 0:
+                trades[t, j] = self.quantity
+            elif signal == SIGNAL_SHORT and cur == 0:
+                trades[t, j] = -self.quantity
+            elif signal == SIGNAL_EXIT:
+                trades[t, j] = -cur
+            current[j] += trades[t, j]
+        return trades
+
+    def run(self, signals):
+        """
+        Computes positions, fills and holdings for a (bars x symbols)
+        signals matrix and builds the equity curve.
+        """
+        prices = self.prices.values
+        trades = self.generate_naive_trades(np.asarray(signals))
+        n = len(prices)
+
+        # Fills: cost at the bar's price plus the IB commission model
+        commissions = np.zeros(trades.shape)
+        for t, j in zip(*np.nonzero(trades)):
+            direction = 'BUY' if trades[t, j] > 0 else 'SELL'
+            commissions[t, j] = FillEvent(
+                None, self.symbol_list[j], 'ARCA', abs(trades[t, j]), direction, None
+            ).commission
+        costs = np.where(trades != 0, trades * prices, 0.0)
+        cash_flow = costs.sum(axis=1) + commissions.sum(axis=1)
+
+        # Each bar is marked before its own fills, plus one final row
+        # after the last fills, as the event-driven loop records
+        positions_after = np.cumsum(trades, axis=0)
+        positions = np.zeros((n + 1, len(self.symbol_list)), dtype=np.int64)
+        positions[1:] = positions_after
+        marks = np.vstack([prices, prices[-1:]])
+        cash = self.initial_capital - np.concatenate([[0.0], np.cumsum(cash_flow)])
+        commission = np.concatenate([[0.0], np.cumsum(commissions.sum(axis=1))])
+
+        # A flat symbol that has not listed yet has a NaN price, but
+        # holds no market value, as in Portfolio.update_timeindex
+        with np.errstate(invalid='ignore'):
+            market_values = positions * marks
+        market_values[positions == 0] = 0.0
+        holdings = pd.DataFrame(market_values, columns=self.symbol_list)
+        holdings['cash'] = cash
+        holdings['commission'] = commission
+        holdings['total'] = cash + market_values.sum(axis=1)
+
+        first = pd.DataFrame(
+            [[0.0] * len(self.symbol_list) + [self.initial_capital, 0.0, self.initial_capital]],
+            columns=holdings.columns
+        )
+        curve = pd.concat([first, holdings], ignore_index=True)
+        curve.index = pd.Index(
+            [self.start_date] + list(self.prices.index) + [self.prices.index[-1]],
+            name='datetime'
+        )
+        curve['returns'] = curve['total'].pct_change()
+        curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
+
+        self.trades = trades
+        self.positions = positions
+        self.equity_curve = curve
+        return curve
+
+    def output_summary_stats(self):
+        """
+        Creates the same list of summary statistics as
+        Portfolio.output_summary_stats.
+        """
+        total_return = self.equity_curve['equity_curve'].iloc[-1]
+        returns = self.equity_curve['returns']
+        pnl = self.equity_curve['equity_curve']
+
+        sharpe_ratio = create_sharpe_ratio(returns, periods=self.periods)
+        drawdown, max_dd, dd_duration = create_drawdowns(pnl)
+        self.equity_curve['drawdown'] = drawdown
+
+        stats = [("Total Return", "%0.2f%%" % ((total_return - 1.0) * 100.0)),
+                 ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
+                 ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
+                 ("Drawdown Duration", "%d" % dd_duration)]
+        return stats
+
+
+def compare_equity_curves(event_curve, vector_curve):
+    """
+    Returns the largest absolute difference between the 'total'
+    columns of an event-driven and a vectorised equity curve,
+    raising ValueError if they do not have the same rows.
+    """
+    if len(event_curve) != len(vector_curve):
+        raise ValueError(
+            "Equity curves differ in length: %d vs %d" % (len(event_curve), len(vector_curve))
+        )
+    diff = np.abs(event_curve['total'].values - vector_curve['total'].values)
+    return np.nanmax(diff)
@@ -20,6 +20,9 @@ class IntradayOLSMRStrategy(Strategy):
     (for the high threshold) or an exit signal pair is generated (for the
     low threshold).
     """
+
+    checkpoint_attrs = ('long_market', 'short_market')
+
     def __init__(self, bars, events, ols_window=100, zscore_low=0.5, zscore_high=3.0):
         """
         Initializes the stat arb strategy.
@@ -39,6 +42,12 @@ class IntradayOLSMRStrategy(Strategy):
         self.long_market = False
         self.short_market = False
 
+    def get_lookback(self):
+        """
+        The rolling OLS window is the widest window requested.
+        """
+        return self.ols_window
+
     def calculate_xy_signals(self, zscore_last):
         """
         Calculates the actual x, y signal pairings
@@ -144,4 +153,5 @@ if __name__ == "__main__":
     )
     
     backtest.simulate_trading()
+    print(backtest.sweep_stats)
 
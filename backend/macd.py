@@ -9,12 +9,25 @@ from event_driven_backtest.data import HistoricCSVDataHandler
 from event_driven_backtest.execution import SimulatedExecutionHandler
 from event_driven_backtest.portfolio import Portfolio
 
+def nan_row_means(values):
+    """
+    Returns the mean of each row of a (symbols x N) window over its
+    non-NaN values, or NaN for a row with none. Symbols with fewer
+    than N bars come NaN padded, so they are averaged over the bars
+    available, as np.mean of their shorter window would.
+    """
+    valid = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, values, 0.0).sum(axis=1) / valid.sum(axis=1)
+
 class MovingAverageCrossStrategy(Strategy):
     """
     Carries out a basic Moving Average Crossover strategy with a
     short/long simple weighted moving average. Default short/long
     windows are 100/400 periods respectively.
     """
+
+    checkpoint_attrs = ('bought', 'in_market')
     
     def __init__(self, bars, events, short_window=100, long_window=400):
         """
@@ -34,6 +47,7 @@ class MovingAverageCrossStrategy(Strategy):
 
         #Set to True if a symbol is in the market
         self.bought = self._calculate_initial_bought()
+        self.in_market = np.zeros(len(self.symbol_list), dtype=bool)
 
     def _calculate_initial_bought(self):
         """
@@ -44,6 +58,12 @@ class MovingAverageCrossStrategy(Strategy):
         for s in self.symbol_list:
             bought[s] = 'OUT'
         return bought
+
+    def get_lookback(self):
+        """
+        The long moving average is the widest window requested.
+        """
+        return self.long_window
     
     def calculate_signals(self, event):
         """
@@ -55,31 +75,96 @@ class MovingAverageCrossStrategy(Strategy):
         event - A MarketEvent object.
         """
         if event.type == 'MARKET':
-            for s in self.symbol_list:
-                bars = self.bars.get_latest_bars_values(
-                    s, "Adj Close", N=self.long_window
+            # One (symbols x N) read for the whole universe
+            bars = self.bars.get_latest_bars_matrix("Adj Close", N=self.long_window)
+            
+            if bars.shape[1] > 0:
+                short_sma = nan_row_means(bars[:, -self.short_window:])
+                long_sma = nan_row_means(bars)
+                # A symbol listed within the short window has the same bars
+                # in both, whose means must not cross on rounding alone
+                same = np.isnan(bars[:, :-self.short_window]).all(axis=1)
+                short_sma[same] = long_sma[same]
+                crossed = (
+                    ((short_sma > long_sma) & ~self.in_market) |
+                    ((short_sma < long_sma) & self.in_market)
                 )
-                bar_date = self.bars.get_latest_bar_datetime(s)
                 
-                if bars is not None and len(bars) > 0:
-                    short_sma = np.mean(bars[-self.short_window:])
-                    long_sma = np.mean(bars[-self.long_window:])
-                    symbol = s
+                for i in np.flatnonzero(crossed):
+                    symbol = self.symbol_list[i]
+                    bar_date = self.bars.get_latest_bar_datetime(symbol)
                     dt = datetime.datetime.now(datetime.timezone.utc)
-                    sig_dir = ""
                     
-                    if short_sma > long_sma and self.bought[s] == "OUT":
+                    if self.bought[symbol] == "OUT":
                         print("LONG: %s" % bar_date)
                         sig_dir = 'LONG'
                         signal = SignalEvent(1, symbol, dt, sig_dir, 1.0)
                         self.events.put(signal)
-                        self.bought[s] = 'LONG'
-                    elif short_sma < long_sma and self.bought[s] == "LONG":
+                        self.bought[symbol] = 'LONG'
+                        self.in_market[i] = True
+                    else:
                         print("SHORT: %s" % bar_date)
                         sig_dir = 'EXIT'
                         signal = SignalEvent(1, symbol, dt, sig_dir, 1.0)
                         self.events.put(signal)
-                        self.bought[s] = 'OUT'
+                        self.bought[symbol] = 'OUT'
+                        self.in_market[i] = False
+
+    def calculate_signals_batch(self, K):
+        """
+        Generates the signals of a block of up to K bars at once. The
+        moving averages of every bar in the block come from running
+        sums over the latest long_window bars joined with the upcoming
+        bars, and the crossover state is carried along the block by a
+        forward fill, so no Python code runs per bar.
+
+        Parameters:
+        K - The number of bars in the block.
+        """
+        past = self.bars.get_latest_bars_matrix("Adj Close", N=self.long_window)
+        upcoming = self.bars.peek_bars_matrix("Adj Close", K - 1)
+        if upcoming is None or past.shape[1] == 0:
+            return None
+        prices = np.concatenate([past, upcoming], axis=1)
+        n, m = prices.shape[0], upcoming.shape[1] + 1
+
+        # Running sums and counts of the non-NaN prices, so that each
+        # window is averaged over its bars available, as nan_row_means
+        valid = ~np.isnan(prices)
+        sums = np.zeros((n, prices.shape[1] + 1))
+        np.cumsum(np.where(valid, prices, 0.0), axis=1, out=sums[:, 1:])
+        counts = np.zeros((n, prices.shape[1] + 1))
+        np.cumsum(valid, axis=1, out=counts[:, 1:])
+
+        # The window of bar k of the block ends (exclusive) at column
+        # past.shape[1] + k, since past already holds the current bar
+        ends = past.shape[1] + np.arange(m)
+        long_starts = np.maximum(ends - self.long_window, 0)
+        short_starts = np.maximum(ends - self.short_window, long_starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            long_sma = (sums[:, ends] - sums[:, long_starts]) / (
+                counts[:, ends] - counts[:, long_starts])
+            short_sma = (sums[:, ends] - sums[:, short_starts]) / (
+                counts[:, ends] - counts[:, short_starts])
+
+        # 1 above, 0 below, -1 (carry the previous state) otherwise
+        state = np.where(short_sma > long_sma, 1, np.where(short_sma < long_sma, 0, -1))
+        state = np.concatenate([self.in_market[:, None].astype(int), state], axis=1)
+        last = np.where(state >= 0, np.arange(m + 1), 0)
+        np.maximum.accumulate(last, axis=1, out=last)
+        state = np.take_along_axis(state, last, axis=1)
+        change = np.diff(state, axis=1)
+
+        dt = datetime.datetime.now(datetime.timezone.utc)
+        block = [[] for _ in range(m)]
+        for k, i in zip(*np.nonzero(change.T)):
+            symbol = self.symbol_list[i]
+            sig_dir = 'LONG' if change[i, k] > 0 else 'EXIT'
+            block[k].append(SignalEvent(1, symbol, dt, sig_dir, 1.0))
+        self.in_market = state[:, -1] == 1
+        for i, symbol in enumerate(self.symbol_list):
+            self.bought[symbol] = 'LONG' if self.in_market[i] else 'OUT'
+        return block
 
 
 if __name__ == "__main__":
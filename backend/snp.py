@@ -8,7 +8,7 @@ from event_driven_backtest.data import HistoricCSVDataHandler
 from event_driven_backtest.execution import SimulatedExecutionHandler
 from event_driven_backtest.portfolio import Portfolio
 import numpy as np
-import yfinance as yf
+from event_driven_backtest.bar_cache import download
 
 def create_lagged_series(symbol, start_date, end_date, lags=5):
     """
@@ -18,7 +18,7 @@ def create_lagged_series(symbol, start_date, end_date, lags=5):
     Trading volume, as well as the Direction from the previous day, are also included.
     """
     # Obtain stock information from Yahoo Finance
-    ts = yf.download(symbol, start=start_date - datetime.timedelta(days=365), end=end_date)
+    ts = download(symbol, start=start_date - datetime.timedelta(days=365), end=end_date)
 
     # Create the new lagged DataFrame
     tslag = pd.DataFrame(index=ts.index)
@@ -56,6 +56,9 @@ class SPYDailyForecastStrategy(Strategy):
     Analyser to predict the returns for a subsequent time period
     and then generates long/exit signals based on the prediction.
     """
+
+    checkpoint_attrs = ('long_market', 'short_market', 'bar_index')
+
     def __init__(self, bars, events):
         self.bars = bars
         self.symbol_list = self.bars.symbol_list
@@ -94,6 +97,12 @@ class SPYDailyForecastStrategy(Strategy):
         
         return model
 
+    def get_lookback(self):
+        """
+        The prediction uses returns over the last three bars.
+        """
+        return 3
+
     def calculate_signals(self, event):
         """
         Calculate the Signal Events based on market data.
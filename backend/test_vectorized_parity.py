@@ -0,0 +1,151 @@
+import contextlib
+import datetime
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from event_driven_backtest.backtest import Backtest
+from event_driven_backtest.bar_cache import BarCache
+from event_driven_backtest.data import HistoricCSVDataHandler
+from event_driven_backtest.event_bus import DequeEventBus
+from event_driven_backtest.portfolio import Portfolio
+from event_driven_backtest.execution import SimulatedExecutionHandler
+from event_driven_backtest.synthetic_data import SyntheticDataHandler
+from event_driven_backtest.vectorized import (
+    VectorizedBacktest, collect_prices, compare_equity_curves,
+    sma_crossover_signals, ols_pairs_signals, ols_pairs_zscores
+)
+from macd import MovingAverageCrossStrategy
+from intraday_mr import IntradayOLSMRStrategy
+
+# Largest absolute difference in portfolio total (USD) accepted
+TOLERANCE = 1e-6
+
+START_DATE = datetime.datetime(2000, 1, 1)
+
+
+def run_parity(strategy, symbol_list, data_handler_params, signal_func,
+               initial_capital=100000.0, start_date=START_DATE, end_date=None,
+               data_handler=SyntheticDataHandler):
+    """
+    Runs a strategy through the event-driven Backtest and its
+    whole-history equivalent through VectorizedBacktest on the
+    same bars (synthetic by default), returning the backtest and
+    the two equity curves.
+    """
+    # Keep the per-fill output of the event-driven run off the console
+    with contextlib.redirect_stdout(io.StringIO()):
+        backtest = Backtest(
+            symbol_list, initial_capital, 0.0, start_date, end_date,
+            data_handler, SimulatedExecutionHandler, Portfolio, strategy,
+            data_handler_params=data_handler_params
+        )
+        backtest._run_backtest()
+        backtest.portfolio.create_equity_curve_dataframe()
+
+    bars = data_handler(
+        DequeEventBus(), symbol_list, start_date, end_date, **data_handler_params
+    )
+    bars.set_lookback(1)
+    prices = collect_prices(bars)
+
+    vectorized = VectorizedBacktest(prices, start_date, initial_capital)
+    vectorized.run(signal_func(prices))
+    return backtest, backtest.portfolio.equity_curve, vectorized.equity_curve
+
+
+CASES = [
+    pytest.param(
+        MovingAverageCrossStrategy, ["SYM%05d" % i for i in range(10)],
+        dict(process='gbm', n_bars=3000, seed=7),
+        lambda prices: sma_crossover_signals(prices.values, 100, 400),
+        id="MovingAverageCrossStrategy"
+    ),
+    pytest.param(
+        IntradayOLSMRStrategy, ['GOOG', 'AAPL'],
+        dict(process='coint', freq='1min', n_bars=5000, seed=7),
+        lambda prices: ols_pairs_signals(prices, ('AAPL', 'GOOG'), 100, 3.0, 0.5),
+        id="IntradayOLSMRStrategy"
+    ),
+]
+
+
+@pytest.mark.parametrize("strategy, symbol_list, params, signal_func", CASES)
+def test_equity_curves_match(strategy, symbol_list, params, signal_func):
+    backtest, event_curve, vector_curve = run_parity(
+        strategy, symbol_list, params, signal_func
+    )
+    assert backtest.fills > 0
+    assert len(event_curve) == len(vector_curve)
+    assert (event_curve.index == vector_curve.index).all()
+    assert compare_equity_curves(event_curve, vector_curve) <= TOLERANCE
+    np.testing.assert_allclose(
+        event_curve['cash'].values, vector_curve['cash'].values, rtol=0, atol=TOLERANCE
+    )
+
+
+def late_listing_cache(cache_dir, symbol_list, n_bars=1500, listing_bar=300, seed=7):
+    """
+    Returns a BarCache of daily random-walk bars for symbol_list,
+    where the last symbol only starts trading at listing_bar, so
+    that 'union' mode pads it with NaN before then.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(START_DATE, periods=n_bars)
+    frames = {}
+    for i, s in enumerate(symbol_list):
+        prices = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, n_bars)))
+        start = listing_bar if i == len(symbol_list) - 1 else 0
+        frames[s] = pd.DataFrame(
+            dict((f, prices[start:]) for f in ('Open', 'High', 'Low', 'Close', 'Adj Close')),
+            index=index[start:]
+        )
+        frames[s]['Volume'] = 1e6
+
+    def fetcher(symbol, start, end, interval):
+        frame = frames[symbol]
+        return frame[(frame.index >= start) & (frame.index < end)]
+    return BarCache(str(cache_dir), fetcher), index[-1] + pd.Timedelta(days=1)
+
+
+def test_equity_curves_match_with_late_listing(tmp_path):
+    symbol_list = ['SYM00000', 'SYM00001', 'SYM00002']
+    bar_cache, end_date = late_listing_cache(tmp_path, symbol_list)
+    backtest, event_curve, vector_curve = run_parity(
+        MovingAverageCrossStrategy, symbol_list,
+        dict(bar_cache=bar_cache, merge='union'),
+        lambda prices: sma_crossover_signals(prices.values, 100, 400),
+        end_date=end_date.to_pydatetime(), data_handler=HistoricCSVDataHandler
+    )
+    # The late listing holds no value before it lists, and is traded after
+    assert not vector_curve['total'].isnull().any()
+    assert (backtest.portfolio.ledger.positions_frame()['SYM00002'] != 0).any()
+    assert len(event_curve) == len(vector_curve)
+    assert compare_equity_curves(event_curve, vector_curve) <= TOLERANCE
+
+
+def test_run_parity_keeps_output_off_stdout(capsys):
+    run_parity(
+        MovingAverageCrossStrategy, ["SYM00000"],
+        dict(process='gbm', n_bars=500, seed=7),
+        lambda prices: sma_crossover_signals(prices.values, 10, 40)
+    )
+    assert capsys.readouterr().out == ""
+
+
+def test_ols_pairs_zscores_match_each_window():
+    rng = np.random.default_rng(7)
+    n, window = 3000, 50
+    # Large, slowly drifting prices, where differences of running
+    # sums lose the most precision
+    x = 5000.0 + np.cumsum(rng.normal(0.0, 1.0, n))
+    y = 1.5 * x + rng.normal(0.0, 0.05, n)
+    zscores = ols_pairs_zscores(y, x, window, chunk_size=128)
+
+    assert np.isnan(zscores[:window - 1]).all()
+    for t in (window - 1, 1000, n - 1):
+        yw, xw = y[t - window + 1:t + 1], x[t - window + 1:t + 1]
+        beta = np.dot(xw, yw) / np.dot(xw, xw)
+        spread = yw - beta * xw
+        expected = (spread[-1] - spread.mean()) / spread.std()
+        assert zscores[t] == pytest.approx(expected, rel=1e-9)